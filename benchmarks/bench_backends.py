@@ -0,0 +1,43 @@
+"""Compares the time taken by the backends to read the same videos.
+
+Usage::
+
+    python benchmarks/bench_backends.py [--videos 16] [--workers 0] [paths ...]
+
+"""
+
+import argparse
+import time
+
+from mydia import Videos
+
+SAMPLE = "./docs/examples/sample_video/bigbuckbunny.mp4"
+SETTINGS = {
+    "16 frames (auto)": dict(target_size=(112, 112), num_frames=16),
+    "16 frames (first)": dict(target_size=(112, 112), num_frames=16, mode="first"),
+    "all frames": dict(target_size=(112, 112)),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", default=[SAMPLE])
+    parser.add_argument("--videos", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=0)
+    args = parser.parse_args()
+
+    paths = (args.paths * args.videos)[: max(args.videos, len(args.paths))]
+    for name, settings in SETTINGS.items():
+        for backend in ["ffmpeg", "pyav"]:
+            reader = Videos(backend=backend, **settings)
+            start = time.perf_counter()
+            reader.read(paths, verbose=0, workers=args.workers)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{name:<20} {backend:<8} {elapsed:8.3f} s "
+                f"({1000 * elapsed / len(paths):.1f} ms/video)"
+            )
+
+
+if __name__ == "__main__":
+    main()
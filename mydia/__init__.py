@@ -1 +1,3 @@
 from .mydia import *
+from .sources import ArchiveMember, FFmpegError, archive_members
+from . import store
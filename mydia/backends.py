@@ -0,0 +1,334 @@
+"""Contains the backends used to decode the videos.
+
+A backend gets the meta-data of a video and decodes its (selected and
+resized) frames. Two backends are available:
+
+* ``"ffmpeg"`` (default): Runs ``ffprobe`` and ``ffmpeg`` in a subprocess
+  for each video, and reads the frames from a pipe.
+* ``"pyav"``: Decodes the videos in the same process with `PyAV
+  <https://pyav.org>`__, straight into NumPy arrays. This avoids starting
+  two processes per video, which dominates the time taken to read short
+  clips. As the GIL is released while decoding, the videos are read with
+  threads (instead of processes) when ``workers`` is set.
+
+A custom backend can be used by passing an instance of a subclass of
+:class:`Backend` to :class:`mydia.Videos`.
+
+"""
+
+from contextlib import contextmanager
+import io
+
+import numpy as np
+
+from .mydia import (
+    _content_indices,
+    _decode_video,
+    _frame_shape,
+    _probe_video,
+    _to_video,
+    _video_info,
+    plan_indices,
+)
+from .sources import (
+    FFmpegError,
+    _load_source,
+    _open_source,
+    _OpenedSource,
+    _source_name,
+)
+from .utils import _CONTENT_MODES
+
+# The values of 'skip_frame' as named by PyAV
+PYAV_SKIP_FRAME = {
+    "noref": "NONREF",
+    "bidir": "BIDIR",
+    "nointra": "NONINTRA",
+    "nokey": "NONKEY",
+}
+
+
+class Backend(object):
+    """Base class of the backends used to decode the videos.
+
+    The instance is sent to the worker processes along with the rest of
+    the configuration of the reader, so it must be picklable.
+
+    Attributes
+    ----------
+    name : str
+        The name of the backend.
+    threads : bool
+        If `True`, the videos are read with threads instead of processes
+        when ``workers`` is set.
+
+    """
+
+    name = None
+    threads = False
+
+    def probe(self, spec, source):
+        """Gets the meta-data of a **single** video.
+
+        Parameters
+        ----------
+        spec : :obj:`mydia.ReaderSpec`
+            The configuration of the reader.
+        source : object
+            The video to be read (a path, ``bytes`` or an
+            :obj:`mydia.ArchiveMember`).
+
+        Returns
+        -------
+        :obj:`mydia.VideoInfo`
+            The meta-data of the video. An exception is raised if the
+            video could not be read.
+
+        """
+        raise NotImplementedError
+
+    def decode(self, spec, task):
+        """Reads in a **single** video.
+
+        Parameters
+        ----------
+        spec : :obj:`mydia.ReaderSpec`
+            The configuration of the reader.
+        task : :obj:`mydia.mydia._Task`
+            The video to be read (already opened, see
+            :func:`mydia.sources._open_source()`), its meta-data and the
+            indices of the frames to select (these are computed if they
+            are `None`).
+
+        Returns
+        -------
+        tuple[:obj:`numpy.ndarray`, :obj:`mydia.TargetSize`]
+            A 5-dimensional tensor of shape
+            ``(1, <frames>, <height>, <width>, <channels>)``, and the size
+            of its frames.
+
+        """
+        raise NotImplementedError
+
+    def transient_errors(self):
+        """The exceptions after which reading a video is retried (see
+        ``retries`` of :class:`mydia.Videos`).
+
+        Returns
+        -------
+        tuple[type]
+            By default, :obj:`OSError` (which includes :obj:`TimeoutError`).
+            The videos that FFmpeg fails to read (see
+            :obj:`mydia.FFmpegError`) are not retried, since such failures
+            (for example, invalid data or a missing codec) happen again on
+            every attempt.
+
+        """
+        return (OSError,)
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+
+class FFmpegBackend(Backend):
+    """Decodes the videos with ``ffmpeg`` in a subprocess (see
+    :func:`mydia.mydia._decode_video`)."""
+
+    name = "ffmpeg"
+
+    def probe(self, spec, source):
+        return _probe_video(spec, source)
+
+    def decode(self, spec, task):
+        return _decode_video(spec, task)
+
+
+class PyAVBackend(Backend):
+    """Decodes the videos in the same process with PyAV.
+
+    The frames are converted and resized by ``libswscale`` (with bicubic
+    interpolation, like the ``scale`` filter of FFmpeg) and copied straight
+    into the output array. Decoding stops after the last selected frame,
+    and if the first selected frame is far into the video, the decoder
+    seeks to the key frame before it instead of decoding every frame up
+    to it.
+
+    Note
+    ----
+    Seeking assumes that the video has a constant frame rate, since the
+    index of a frame is then computed from its timestamp. It is not used
+    if ``skip_frame`` is set, as the indices are then with respect to the
+    decoded frames only.
+
+    """
+
+    name = "pyav"
+    threads = True
+
+    def probe(self, spec, source):
+        import av
+
+        with _pyav_errors(source), _open_container(source) as container:
+            stream = container.streams.video[0]
+            video_stream = {
+                "codec_type": "video",
+                "avg_frame_rate": str(stream.average_rate or "0/1"),
+                "width": stream.width,
+                "height": stream.height,
+            }
+            if spec.skip_frame is not None:
+                # Same as `ffprobe -count_frames`, see `_probe_video()`
+                _set_skip_frame(stream, spec.skip_frame)
+                count = sum(1 for _ in container.decode(stream))
+                video_stream["nb_read_frames"] = count
+            elif stream.frames > 0:
+                video_stream["nb_frames"] = stream.frames
+            if stream.duration is not None:
+                video_stream["duration"] = stream.duration * stream.time_base
+            duration = None
+            if container.duration is not None:
+                duration = container.duration / av.time_base
+
+        probe = {"streams": [video_stream], "format": {"duration": duration}}
+        return _video_info(spec, probe)
+
+    def decode(self, spec, task):
+        info = task.info
+        if info is None:
+            info = self.probe(spec, task.source)
+        fps, total_frames, target_size = info[:3]
+
+        if spec.mode in _CONTENT_MODES:
+            # The scene scores are computed by FFmpeg
+            with _open_source(task.source) as opened:
+                task = _content_indices(spec, opened, task._replace(info=info))
+
+        indices = None
+        if spec.num_frames is not None:
+            indices = task.indices
+            if indices is None:
+                indices = plan_indices(
+                    [total_frames],
+                    spec.num_frames,
+                    mode=spec.mode,
+                    fps=[fps],
+                    random_state=spec.random_state,
+                    keys=[task.key],
+                )[0]
+            # Same as the `select` filter, which keeps every frame once
+            indices = np.unique(np.asarray(indices, dtype=np.int64))
+
+        with _pyav_errors(task.source), _open_container(task.source) as container:
+            stream = container.streams.video[0]
+            stream.thread_type = "AUTO"
+            if spec.skip_frame is not None:
+                _set_skip_frame(stream, spec.skip_frame)
+            if spec.lowres > 0:
+                stream.codec_context.options = {"lowres": str(spec.lowres)}
+            frames = _select_frames(container, stream, indices, spec.skip_frame)
+            video = _frames_to_array(frames, spec, target_size, indices)
+
+        return _to_video(spec, video, target_size), target_size
+
+
+BACKENDS = {"ffmpeg": FFmpegBackend(), "pyav": PyAVBackend()}
+
+
+@contextmanager
+def _pyav_errors(source):
+    """Used internally to raise the errors of PyAV as an
+    :obj:`mydia.FFmpegError`, that names the video."""
+    import av
+
+    try:
+        yield
+    except av.FFmpegError as e:
+        name = _source_name(source) or "<bytes>"
+        raise FFmpegError("pyav", name, e.errno, str(e).encode()) from e
+
+
+def _open_container(source):
+    """Used internally to open a video with PyAV. Videos that are not
+    files are read from memory."""
+    import av
+
+    if isinstance(source, _OpenedSource):
+        source = source.filename if source.data is None else source.data
+    if not isinstance(source, str):
+        source = io.BytesIO(_load_source(source))
+    return av.open(source)
+
+
+def _set_skip_frame(stream, skip_frame):
+    """Used internally to make the decoder skip frames."""
+    stream.codec_context.skip_frame = PYAV_SKIP_FRAME[skip_frame]
+
+
+def _select_frames(container, stream, indices, skip_frame):
+    """Used internally to decode the frames of a video, and yield the ones
+    to select (or all of them, if ``indices`` is `None`)."""
+    if indices is None:
+        yield from container.decode(stream)
+        return
+    if len(indices) == 0:
+        return
+
+    rate = stream.average_rate
+    seek = (
+        (skip_frame is None)
+        and (rate is not None)
+        and (stream.time_base is not None)
+        and (indices[0] > 0)
+    )
+    start = stream.start_time or 0
+    if seek:
+        target = start + int(int(indices[0]) / rate / stream.time_base)
+        container.seek(target, stream=stream, backward=True, any_frame=False)
+
+    wanted = iter(indices.tolist())
+    idx = next(wanted)
+    for count, frame in enumerate(container.decode(stream)):
+        position = count
+        if seek:
+            if frame.pts is None:
+                raise ValueError("The timestamps of the frames are not known")
+            position = round((frame.pts - start) * stream.time_base * rate)
+        if position > idx:
+            break
+        if position == idx:
+            yield frame
+            idx = next(wanted, None)
+            if idx is None:
+                return
+    raise ValueError(f"Frame {idx} of the video could not be decoded")
+
+
+def _frames_to_array(frames, spec, target_size, indices):
+    """Used internally to convert (and resize) the decoded frames, and copy
+    them into a single array of shape ``(<frames>, <height>, <width>,
+    <channels>)``."""
+    shape = _frame_shape(spec, target_size)
+    if indices is not None:
+        video = np.empty((len(indices),) + shape, dtype=np.uint8)
+        for idx, frame in enumerate(frames):
+            video[idx] = _frame_to_array(frame, spec.pix_fmt, target_size, shape)
+        return video
+
+    video = [
+        _frame_to_array(frame, spec.pix_fmt, target_size, shape) for frame in frames
+    ]
+    if not video:
+        return np.empty((0,) + shape, dtype=np.uint8)
+    return np.stack(video)
+
+
+def _frame_to_array(frame, pix_fmt, target_size, shape):
+    """Used internally to convert a decoded frame to an array of the given
+    shape ``(<height>, <width>, <channels>)``."""
+    frame = frame.reformat(
+        width=target_size.width,
+        height=target_size.height,
+        format=pix_fmt,
+        interpolation="BICUBIC",
+    )
+    return frame.to_ndarray().reshape(shape)
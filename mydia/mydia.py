@@ -5,30 +5,91 @@ advance support for frame selection, frame resizing, pixel normalization
 and grayscale conversion.
 
 The module  uses **FFmpeg** as its backend to read and process the videos.
+The python packages ``ffmpeg-python`` and ``tqdm`` are imported only when
+they are first needed, so importing the module is cheap.
 
 """
 
 __version__ = "2.2.2"
 __author__ = "Mrinal Jain"
 
-from multiprocessing import cpu_count, Pool
-from typing import NamedTuple
+from contextlib import contextmanager
+from functools import partial
+import hashlib
+import heapq
+import json
+import os
+import tempfile
+import time
+from typing import Callable, NamedTuple
 import warnings
+import zlib
 
-import ffmpeg
 import numpy as np
-from tqdm import tqdm
 
-from .utils import _mode_auto, _mode_first, _mode_last, _mode_middle, _mode_random
-
-NUM_CHANNELS = {"rgb24": 3, "gray": 1}
+from .sources import (
+    ArchiveMember,
+    FFmpegError,
+    _check_sources,
+    _open_source,
+    _probe,
+    _run,
+    _run_outputs,
+    _source_name,
+    archive_members,
+)
+from .utils import (
+    _BATCHED_MODES,
+    _CONTENT_MODES,
+    _SEEDED_MODES,
+    _mode_auto,
+    _mode_first,
+    _mode_keyframes,
+    _mode_last,
+    _mode_middle,
+    _mode_random,
+    _mode_scene,
+    _video_seeds,
+)
+
+NUM_CHANNELS = {"rgb24": 3, "gray": 1, "yuv420p": 1}
 MODES = {
     "auto": _mode_auto,
     "random": _mode_random,
     "first": _mode_first,
     "last": _mode_last,
     "middle": _mode_middle,
+    "keyframes": _mode_keyframes,
+    "scene": _mode_scene,
 }
+# Modes that only make sense on the key frames of a video. Selecting one
+# of these makes the decoder skip every non-key frame.
+KEYFRAME_MODES = {"keyframes"}
+SKIP_FRAME = ["noref", "bidir", "nointra", "nokey"]
+# The width the frames are scaled down to, to compute their scene scores
+SCENE_WIDTH = 160
+# With `workers="auto"`, the tasks are sent to the workers in chunks that
+# take about this long (in seconds) to run
+CHUNK_TIME = 0.05
+# The number of frames converted at a time by `yuv420_to_rgb()`
+YUV_CHUNK = 32
+# The output of FFmpeg for a video may be at most this many times as large
+# as expected (from the meta-data of the video)
+OUTPUT_MARGIN = 2
+# The maximum size (in bytes) of the output of FFmpeg for a video whose
+# number of frames and duration are both unknown
+MAX_OUTPUT = 2**34
+
+_NUM_FRAMES_MISMATCH = """The number of frames to be selected returned
+by the callable does not match the value of the parameter
+'num_frames'. Your callable should return the same number
+of frames for every video, regardless of their individual
+duration."""
+_SHAPE_MISMATCH = (
+    "The videos have different dimensions and cannot be stacked into a "
+    "single tensor, set 'target_size' and 'num_frames' to resize them, or "
+    "set 'variable_size'"
+)
 
 
 class TargetSize(NamedTuple):
@@ -39,6 +100,40 @@ class TargetSize(NamedTuple):
     rescale: bool = False
 
 
+class VideoInfo(NamedTuple):
+    """A named tuple representing the meta-data of a video"""
+
+    fps: int
+    total_frames: int
+    target_size: TargetSize
+    width: int
+    height: int
+    duration: float
+
+
+class ReaderSpec(NamedTuple):
+    """A named tuple representing the configuration of a :class:`Videos`
+    reader.
+
+    It is immutable, and is sent only once to each worker process when the
+    videos are read in parallel.
+
+    """
+
+    target_size: TargetSize
+    pix_fmt: str
+    num_frames: int
+    mode: Callable
+    normalize: bool
+    dtype: str
+    random_state: int
+    skip_frame: str
+    lowres: int
+    backend: object
+    timeout: float
+    retries: int
+
+
 class Videos(object):
     """Class to read in videos and store them as numpy arrays
 
@@ -59,7 +154,8 @@ class Videos(object):
         If not set, all the frames of the video are kept.
     mode : str
         The method used for frame extraction if ``num_frames`` is set.
-        It could be one of "auto", "random", "first", "last" or "middle".
+        It could be one of "auto", "random", "first", "last", "middle",
+        "keyframes" or "scene".
 
         * ``"auto"``: **N** frames will be extracted at equal intervals.
         * ``"random"``: **N** frames will be randomly extracted (no
@@ -67,6 +163,22 @@ class Videos(object):
         * ``"first"``, ``"last"`` and ``"middle"`` will extract **N**
           contiguous frames from the beginning, end and middle of the
           video respectively.
+        * ``"keyframes"``: **N** key frames will be extracted at equal
+          intervals. Only the key frames are decoded (this implies
+          ``skip_frame="nokey"``, and any other value of ``skip_frame``
+          raises a :obj:`ValueError`), which makes it a lot faster than
+          the other modes. If ``num_frames`` is not set, all the key
+          frames of the video are kept.
+        * ``"scene"``: The **N** frames where the scene changes the most
+          will be extracted (the first frame is always extracted). The
+          scene change score of each frame is computed by FFmpeg in a
+          first pass over the video (at a low resolution), and only the
+          selected frames are decoded in the second pass. Each video is
+          therefore decoded twice, which takes about twice as long as
+          the other modes (a single pass would have to keep every frame
+          in memory until all the scores are known). If many frames tie
+          for the last places (as in a static video), they are picked at
+          equal intervals.
     normalize : bool
         Shifts each video to the range `(0, 1)` by subtracting the minimum
         and dividing by the difference between the maximum and the minimum
@@ -80,10 +192,88 @@ class Videos(object):
           ``(<videos>, <channels>, <frames>, <height>, <width>)``
 
         ``channels`` will be **3** for videos in RGB format, or **1**
-        for videos in grayscale.
+        for videos in grayscale (or in the ``"yuv420p"`` pixel format).
     random_state : int
         Integer that seeds the (numpy) random number generator, defaults
-        to 17. Used only when ``mode`` is set to "random".
+        to 17. Used only when ``mode`` is set to "random". Each video gets
+        its own seed, derived from ``random_state`` and the path of the
+        video (or its position in ``paths``, if it has no path). Therefore,
+        the frames selected for a video do not depend on the other videos,
+        or on the order in which they are read.
+    skip_frame : str
+        Frames that the decoder should not decode at all, defaults to
+        `None`. It could be one of "noref", "bidir", "nointra" or "nokey"
+        (see the ``-skip_frame`` option of FFmpeg). With ``"nokey"``, only
+        the key frames of the video are decoded. The frames selected by
+        ``mode`` are then picked from the decoded frames only.
+    lowres : int
+        Decode the frames at ``1 / 2**lowres`` of their resolution,
+        defaults to 0. It could be one of 0, 1, 2 or 3. This is done by
+        the decoder itself and is therefore much cheaper than resizing
+        with ``target_size``, but only a few codecs (for example MJPEG)
+        support it. For the other codecs the frames are decoded at full
+        resolution and scaled down afterwards, so the shape of the output
+        does not depend on the codec.
+    variable_size : str
+        How to return videos of different dimensions ``(frames, height,
+        width)``, defaults to `None`. Each video is decoded only once, at
+        its own dimensions (unless ``target_size`` and ``num_frames`` are
+        set).
+
+        * `None`: The videos are stacked into a single tensor, so they
+          must have the same dimensions.
+        * ``"ragged"``: The videos are returned as a :class:`RaggedVideos`,
+          which keeps all of them in a single contiguous buffer.
+        * ``"pad"``: The videos are padded (at the end of each dimension)
+          with zeros to the largest dimensions in the batch, and are
+          returned along with a boolean mask of shape
+          ``(<videos>, <frames>, <height>, <width>)``, that is `True` for
+          the valid pixels.
+    backend : str
+        The backend used to decode the videos, defaults to "ffmpeg". It
+        could be "ffmpeg" or "pyav".
+
+        * ``"ffmpeg"``: Each video is decoded by ``ffmpeg``, in a
+          subprocess.
+        * ``"pyav"``: The videos are decoded in the same process with
+          PyAV (which must be installed), and read with threads if
+          ``workers`` is set. This is faster for short videos, as no
+          process is started for each of them.
+
+        An instance of :class:`mydia.backends.Backend` can also be passed
+        to use a custom backend.
+    timeout : float
+        The maximum time (in seconds) that each FFmpeg process may take,
+        defaults to `None` (no limit). A process that takes longer (for
+        example, one that hangs on a corrupt video) is killed, and a
+        :obj:`TimeoutError` is raised. This does not apply to the videos
+        decoded in-process by the ``"pyav"`` backend. Regardless of this,
+        the output of FFmpeg for a video is limited to twice its expected
+        size (from its number of frames, or else from its duration and
+        frame rate), so that a corrupt video cannot use up all the memory:
+        a :obj:`MemoryError` is raised instead. If neither is known, the
+        output is limited to ``mydia.MAX_OUTPUT`` bytes (16 GiB).
+    retries : int
+        The number of times to retry reading a video that failed with a
+        transient error (such as a timeout), defaults to 0.
+    pix_fmt : str
+        The pixel format of the output, defaults to `None` (in which case
+        it is "gray" if ``to_gray`` is set, and "rgb24" otherwise). It
+        could be one of "rgb24", "gray" or "yuv420p".
+
+        * ``"yuv420p"``: The frames are returned in the planar YUV 4:2:0
+          format, which takes half the memory of "rgb24" (this is the
+          format that most videos are encoded in). Each frame has a single
+          channel and a height of ``3 * <height> / 2``: the luma (Y) plane
+          is followed by the two chroma (U and V) planes, each of half the
+          width and height (the same layout as ``I420`` in OpenCV). The
+          width and the height of the frames must be even. Use
+          :func:`yuv420_to_rgb` to convert the videos to RGB, when needed.
+    dtype : str
+        The data type of the normalized videos, defaults to "float64". It
+        could be "float32" (or "float16") to halve (or quarter) the memory
+        taken by the output. Not used if ``normalize`` is not set (the
+        videos are then always of type ``uint8``).
 
     Example
     -------
@@ -103,18 +293,25 @@ class Videos(object):
     Note
     ----
     You could also pass a `callable` to ``mode`` for custom frame
-    extraction. The `callable` should return a **list of integers**,
-    denoting the indices of the frames to be extracted. It should
-    take 4 (non-keyword) arguments:
+    extraction. The `callable` should return a **list of integers** (or
+    a NumPy array), denoting the indices of the frames to be extracted.
+    It should take 4 (non-keyword) arguments:
 
     * ``total_frames``: The total number of frames in the video
     * ``num_frames``: The number of frames that you want to extract
     * ``fps``: The frame rate of the video
-    * ``random_state``: Integer to seed the random number generator
+    * ``random_state``: Integer to seed the random number generator (the
+      seed of the video, derived from the parameter ``random_state``)
 
     These arguments may/may not be used to generate the required
     frame indices. Detailed examples are provided in the documentation.
 
+    The worker processes (see ``workers`` of :func:`Videos.read()`) are
+    started with the ``"fork"`` method wherever it is available, so that
+    they inherit the `callable`. On platforms without it (Windows), the
+    `callable` must be picklable (defined at the top level of a module,
+    not a ``lambda``).
+
     Warning
     -------
     If you are passing a `callable` to ``mode``, then make sure that
@@ -134,6 +331,14 @@ class Videos(object):
         normalize=False,
         data_format="channels_last",
         random_state=17,
+        skip_frame=None,
+        lowres=0,
+        variable_size=None,
+        backend="ffmpeg",
+        timeout=None,
+        retries=0,
+        pix_fmt=None,
+        dtype="float64",
     ):
         """Initializing class variables"""
         self.target_size = None
@@ -145,22 +350,39 @@ class Videos(object):
             else:
                 raise ValueError("Invalid value of 'target_size'")
 
-        self.pix_fmt = "rgb24"
-        if to_gray:
-            self.pix_fmt = "gray"
+        if pix_fmt is None:
+            pix_fmt = "gray" if to_gray else "rgb24"
+        if (pix_fmt in NUM_CHANNELS) and (not to_gray or pix_fmt == "gray"):
+            self.pix_fmt = pix_fmt
+        else:
+            raise ValueError("Invalid value of 'pix_fmt'")
+        if (pix_fmt == "yuv420p") and (self.target_size is not None):
+            _check_even(self.target_size)
 
         self.num_frames = num_frames
 
         if isinstance(mode, str):
-            if mode in ["auto", "first", "middle", "last", "random"]:
+            if mode in MODES:
                 self.mode = MODES[mode]
             else:
                 raise ValueError("Invald value of 'mode'")
+            if mode in KEYFRAME_MODES:
+                if skip_frame not in [None, "nokey"]:
+                    raise ValueError(
+                        f"Invalid value of 'skip_frame' for mode '{mode}', "
+                        'which only decodes the key frames ("nokey")'
+                    )
+                skip_frame = "nokey"
         else:
             self.mode = mode
 
         self.normalize = normalize
 
+        if np.dtype(dtype).kind == "f":
+            self.dtype = np.dtype(dtype).name
+        else:
+            raise ValueError("Invalid value of 'dtype'")
+
         if data_format in ["channels_last", "channels_first"]:
             self.data_format = data_format
         else:
@@ -168,16 +390,54 @@ class Videos(object):
 
         self.random_state = random_state
 
-    def read(self, paths, verbose=1, workers=0):
+        if (skip_frame is None) or (skip_frame in SKIP_FRAME):
+            self.skip_frame = skip_frame
+        else:
+            raise ValueError("Invalid value of 'skip_frame'")
+
+        if lowres in [0, 1, 2, 3]:
+            self.lowres = lowres
+        else:
+            raise ValueError("Invalid value of 'lowres'")
+
+        if variable_size in [None, "ragged", "pad"]:
+            self.variable_size = variable_size
+        else:
+            raise ValueError("Invalid value of 'variable_size'")
+
+        from .backends import BACKENDS, Backend
+
+        if isinstance(backend, Backend):
+            self.backend = backend
+        elif backend in BACKENDS:
+            self.backend = BACKENDS[backend]
+        else:
+            raise ValueError("Invalid value of 'backend'")
+
+        if (timeout is None) or (timeout > 0):
+            self.timeout = timeout
+        else:
+            raise ValueError("Invalid value of 'timeout'")
+
+        if isinstance(retries, int) and (retries >= 0):
+            self.retries = retries
+        else:
+            raise ValueError("Invalid value of 'retries'")
+
+    def read(self, paths, verbose=1, workers=0, max_memory=None, spill_path=None):
         """Function to read videos
 
         Parameters
         ----------
         paths : str or list[str]
-            A list of paths/path of the video(s) to be read.
+            A list of paths/path of the video(s) to be read. Instead of a
+            path, a video can also be given as ``bytes``, as a file-like
+            object, or as an :obj:`ArchiveMember` of a tar/zip archive (see
+            :func:`archive_members`). These are passed on to FFmpeg through
+            a pipe, without being written to the disk.
         verbose : int
             If set to 0, the progress bar will be disabled.
-        workers : int
+        workers : int or str
             The number of processes (CPUs) to use for reading the videos.
             This uses the ``multiprocessing`` module present in the python
             standard library.
@@ -187,26 +447,66 @@ class Videos(object):
             on your machine.
 
             Defaults to 0, which means that multiprocessing will **not**
-            be used.
+            be used. If set to ``"auto"``, the number of workers and the
+            number of videos sent to a worker at a time are tuned while
+            reading the first videos. What is learnt is cached (in
+            ``~/.cache/mydia``) for the next reads of videos from the same
+            directory, with the same settings.
+        max_memory : int
+            The maximum size (in bytes) of the tensor to keep in memory,
+            defaults to `None`. If the tensor would be larger, it is written
+            to a memory-mapped ``.npy`` file instead (at ``spill_path``).
+            This is not supported if ``variable_size`` is set.
+        spill_path : str
+            The path of the ``.npy`` file used if ``max_memory`` is
+            exceeded, defaults to `None`, in which case a temporary file
+            is used. It is removed as soon as it is created (except on
+            Windows), so it takes up disk space only as long as the tensor
+            is in use. Set ``spill_path`` to keep the file, in which case
+            it is up to the caller to delete it.
 
         Returns
         -------
         :obj:`numpy.ndarray`
             A 5-dimensional tensor, whose shape will depend on the value
-            of ``data_format``.
+            of ``data_format``. It is a :obj:`numpy.memmap` if
+            ``max_memory`` is exceeded.
 
             * For ``"channels_last"``: The tensor will have shape
               ``(<videos>, <frames>, <height>, <width>, <channels>)``
             * For ``"channels_first"``: The tensor will have shape
               ``(<videos>, <channels>, <frames>, <height>, <width>)``
 
+            If ``variable_size`` is set to ``"ragged"``, a
+            :class:`RaggedVideos` is returned instead. If it is set to
+            ``"pad"``, a tuple of the (padded) tensor and its mask is
+            returned.
+
         Raises
         ------
         ValueError
-            If ``paths`` is neither a string, not a list of strings.
+            If ``paths`` is not a valid video (or a non-empty list of
+            videos), or if the videos have different dimensions and
+            ``variable_size`` is not set.
         IndexError
             If ``num_frames`` is set to a value greater than the total
             number of frames available in the video.
+        MemoryError
+            If the tensor would not fit in the available memory (and
+            ``max_memory`` is not set), or exceeds ``max_memory`` when
+            ``variable_size`` is set. The size of the tensor is estimated
+            from the meta-data of the videos before decoding them.
+
+        Note
+        ----
+        Even if ``max_memory`` is not set, the estimated size of the tensor
+        is checked against the memory available (as reported by
+        ``/proc/meminfo``, on Linux) before decoding the videos. Set
+        ``max_memory`` (to the size of the tensor, to keep it in memory
+        anyway, or lower, to write it to a file) to skip this check. The
+        videos that are not files (archive members and file-like objects)
+        are only probed while being read, and are assumed to be as large
+        as the others on average.
 
         Important
         ---------
@@ -214,194 +514,1643 @@ class Videos(object):
         the same dimension ``(frames, height, width)``, otherwise they
         cannot be stacked into a single tensor. Therefore, the user **must**
         use the parameters ``target_size`` and ``num_frames`` to make
-        sure of this.
+        sure of this, or set ``variable_size``.
 
         """
-        if not isinstance(paths, list):
-            if isinstance(paths, str):
-                paths = [paths]
-            else:
-                raise ValueError("Invalid value of 'paths'")
+        paths = _check_sources(paths)
         disable = False
         if verbose == 0:
             disable = True
 
-        video_tensor = None
-        if (isinstance(workers, int)) and (workers > 0):
-            video_tensor = self._read_parallel(paths, disable, workers)
-        else:
-            paths_iterator = tqdm(paths, unit="videos", disable=disable)
-            video_tensor = np.vstack(list(map(self._read_video, paths_iterator)))
+        spec = self.spec
+        with _worker_pool(spec, workers, paths) as pool:
+            infos = _probe_paths(pool, spec, paths)
+            nbytes = _estimate_nbytes(spec, infos, self.variable_size)
+            limit = max_memory
+            if limit is None:
+                limit = _available_memory()
+            spill = (limit is not None) and (nbytes > limit)
+            if spill and (self.variable_size is not None):
+                raise MemoryError(
+                    f"Reading the videos needs about {nbytes / 2 ** 30:.2f} GiB "
+                    f"of memory, more than the limit of {limit / 2 ** 30:.2f} "
+                    "GiB. Use 'iter_read()' to read them in batches, or raise "
+                    "'max_memory=' (videos of variable size cannot be written "
+                    "to a memory-mapped file)"
+                )
+            if spill and (max_memory is None):
+                raise MemoryError(
+                    f"Reading the videos needs about {nbytes / 2 ** 30:.2f} GiB "
+                    f"of memory, but only {limit / 2 ** 30:.2f} GiB is "
+                    "available. Set 'max_memory=' (in bytes) to write them to "
+                    "a memory-mapped file instead, or use 'iter_read()' to "
+                    "read them in batches"
+                )
+
+            tasks = _plan_tasks(spec, paths, infos)
+            results = _map_tasks(
+                pool, _decode_task, spec, tasks, disable, ordered=False
+            )
+            if self.variable_size is not None:
+                videos = [None] * len(tasks)
+                for idx, (video, _) in results:
+                    videos[idx] = video[0]
+                return self._collate(videos)
+
+            # The videos are copied into their place in the tensor as soon
+            # as they are read, in the order in which they are read
+            video_tensor = None
+            for idx, (video, _) in results:
+                if video_tensor is None:
+                    shape = (len(paths),) + video.shape[1:]
+                    if spill:
+                        video_tensor = _open_spill(spill_path, shape, video.dtype)
+                    else:
+                        video_tensor = np.empty(shape, dtype=video.dtype)
+                elif video.shape[1:] != video_tensor.shape[1:]:
+                    raise ValueError(_SHAPE_MISMATCH)
+                video_tensor[idx] = video[0]
 
         if self.data_format == "channels_first":
             video_tensor = np.transpose(video_tensor, axes=(0, 4, 1, 2, 3))
 
         return video_tensor
 
-    def _read_parallel(self, paths, disable, workers):
-        """Used internally by :func:`read()` to read the videos in parallel.
+    def iter_read(self, paths, batch_size=32, verbose=1, workers=0):
+        """Function to read videos in batches
 
-        This uses the ``multiprocessing`` module present in the python
-        standard library.
+        Same as :func:`read()`, but the videos are returned in batches of
+        ``batch_size`` videos, as soon as they are read. Only one batch is
+        kept in memory at a time.
 
-        The function is constructed in a way so as to guarantee the
-        reproducibility of frames, irrespective of the `mode` used for
-        frame selection.
+        Parameters
+        ----------
+        paths : str or list[str]
+            A list of paths/path of the video(s) to be read.
+        batch_size : int
+            The number of videos in each batch, defaults to 32.
+        verbose : int
+            If set to 0, the progress bar will be disabled.
+        workers : int
+            The number of processes (CPUs) to use for reading the videos.
+            Same as for :func:`read()`.
+
+        Yields
+        ------
+        :obj:`numpy.ndarray`
+            A batch of videos, same as the output of :func:`read()`.
+
+        Example
+        -------
+        .. code-block:: python
+
+           from mydia import Videos
+
+           reader = Videos(target_size=(224, 224), num_frames=16)
+           for batch in reader.iter_read(paths, batch_size=64, workers=4):
+               ...
 
         """
-        max_workers = cpu_count()
-        if workers > max_workers:
-            warnings.warn(f"The CPU can support maximum {max_workers} workers.")
-            workers = max_workers
-        list_of_videos = []
-        with Pool(workers) as pool:
-            with tqdm(total=len(paths), unit="videos", disable=disable) as pbar:
-                for _, result in enumerate(pool.imap(self._read_video, paths)):
-                    list_of_videos.append(result)
-                    pbar.update()
-        pool.join()
-
-        return np.vstack(list_of_videos)
+        paths = _check_sources(paths)
+        disable = False
+        if verbose == 0:
+            disable = True
 
-    def _read_video(self, path):
-        """Used internally by :func:`read()` to read in a **single** video.
+        spec = self.spec
+        tasks = _plan_tasks(spec, paths)
+        with _worker_pool(spec, workers, paths) as pool:
+            batch = []
+            for video, _ in _map_tasks(pool, _decode_task, spec, tasks, disable):
+                batch.append(video[0])
+                if len(batch) == batch_size:
+                    yield self._collate(batch)
+                    batch = []
+            if batch:
+                yield self._collate(batch)
+
+    def probe(self, paths, verbose=1, workers=0):
+        """Function to get the meta-data of videos, without reading them
 
         Parameters
         ----------
-        path : str
-            The path of the video to be read.
+        paths : str or list[str]
+            A list of paths/path of the video(s). Same as for
+            :func:`read()`.
+        verbose : int
+            If set to 0, the progress bar will be disabled.
+        workers : int
+            The number of processes (CPUs) to use. Same as for
+            :func:`read()`.
 
         Returns
         -------
-        :obj:`numpy.ndarray`
-            A 5-dimensional tensor, whose shape will depend on the value
-            of ``data_format``
+        list[:obj:`VideoInfo`]
+            The meta-data of each video. It can be used as the probe
+            index of :func:`shard_indices`.
 
-            * For ``"channels_last"``: The tensor will have shape
-              ``(1, <frames>, <height>, <width>, <channels>)``
-            * For ``"channels_first"``: The tensor will have shape
-              ``(1, <channels>, <frames>, <height>, <width>)``
+        Raises
+        ------
+        FFmpegError
+            If ``ffprobe`` fails to read a video (with the ``"ffmpeg"``
+            backend).
 
         """
-        fps, total_frames = self._probe(path)
-        width = self.target_size.width
-        height = self.target_size.height
+        paths = _check_sources(paths)
+        disable = False
+        if verbose == 0:
+            disable = True
 
-        out = ffmpeg.input(filename=path)
+        spec = self.spec
+        with _worker_pool(spec, workers, paths) as pool:
+            return list(_map_tasks(pool, _probe_task, spec, paths, disable))
 
-        if self.num_frames is not None:
-            assert total_frames is not None
-            if self.num_frames <= total_frames:
-                indices = self.mode(
-                    total_frames, self.num_frames, fps, self.random_state
-                )
-                temp_msg = """The number of frames to be selected returned
-                by the callable does not match the value of the parameter
-                'num_frames'. Your callable should return the same number
-                of frames for every video, regardless of their individual
-                duration."""
-                assert len(indices) == self.num_frames, temp_msg
-                select_str = "+".join([f"eq(n,{idx})" for idx in indices])
-                out = out.filter("select", select_str)
-            else:
-                raise IndexError(
-                    "The value of 'num_frames' is greater than the total "
-                    "number of frames available"
-                )
+    def _collate(self, videos):
+        """Used internally to combine a list of ``"channels_last"`` videos
+        into the output of :func:`read()`."""
+        if self.variable_size == "ragged":
+            return RaggedVideos.from_videos(videos, self.data_format)
+        if self.variable_size == "pad":
+            return _pad_videos(videos, self.data_format)
 
-        if self.target_size.rescale:
-            out = out.filter("scale", width, height)
+        if len({video.shape for video in videos}) > 1:
+            raise ValueError(_SHAPE_MISMATCH)
+        video_tensor = np.stack(videos)
 
-        out = out.output("pipe:", vsync=0, format="rawvideo", pix_fmt=self.pix_fmt)
-        out = out.global_args("-loglevel", "panic", "-hide_banner")
-        out, _ = out.run(capture_stdout=True)
-        video = np.frombuffer(out, np.uint8).reshape(
-            [-1, height, width, NUM_CHANNELS[self.pix_fmt]]
+        if self.data_format == "channels_first":
+            video_tensor = np.transpose(video_tensor, axes=(0, 4, 1, 2, 3))
+
+        return video_tensor
+
+    @property
+    def spec(self):
+        """:obj:`ReaderSpec`: An immutable snapshot of the configuration of
+        the reader, which is all that is needed to read a video."""
+        return ReaderSpec(
+            target_size=self.target_size,
+            pix_fmt=self.pix_fmt,
+            num_frames=self.num_frames,
+            mode=self.mode,
+            normalize=self.normalize,
+            dtype=self.dtype,
+            random_state=self.random_state,
+            skip_frame=self.skip_frame,
+            lowres=self.lowres,
+            backend=self.backend,
+            timeout=self.timeout,
+            retries=self.retries,
         )
 
-        if self.normalize:
-            min_, max_ = np.min(video), np.max(video)
-            video = np.clip(video, min_, max_)
-            video = (video.astype("float") - min_) / (max_ - min_ + 1e-5)
+    def _read_video(self, path):
+        """Used internally to read in a **single** video.
+
+        See :func:`Backend.decode() <mydia.backends.Backend.decode>`.
 
-        return np.expand_dims(video, axis=0)
+        """
+        return self.backend.decode(self.spec, _Task(path))
 
     def _probe(self, path):
-        """Used internally by :func:`_read_video()` to get the meta-data of a video
+        """Used internally to get the meta-data of a **single** video.
 
-        Note
-        ----
-        This function also sets the `default` dimensions of the video,
-        if the frames are not to be resized.
+        See :func:`Backend.probe() <mydia.backends.Backend.probe>`.
+
+        """
+        return self.backend.probe(self.spec, path)
+
+
+class _Task(NamedTuple):
+    """A named tuple representing the task of reading a **single** video:
+    the video itself, and what is already known about it.
+
+    The meta-data of the video and the indices of the frames to select
+    are computed by the worker, if they are `None`. The key of the video
+    is used to derive its seed (see :func:`plan_indices()`).
+
+    """
+
+    source: object
+    info: VideoInfo = None
+    key: object = 0
+    indices: np.ndarray = None
+
+
+def _plan_tasks(spec, sources, infos=None, keys=None):
+    """Used internally to make the tasks of reading the videos.
+
+    The indices of the frames to select are computed at once, for all the
+    videos whose meta-data is known. Those of the other videos are computed
+    by the workers (the same ones, since they only depend on the meta-data
+    and the key of each video). The ``keys`` of the videos default to their
+    names (or positions).
+
+    """
+    if keys is None:
+        keys = [_video_key(source, idx) for idx, source in enumerate(sources)]
+    if infos is None:
+        return [_Task(source, key=key) for source, key in zip(sources, keys)]
+
+    all_indices = [None] * len(sources)
+    known = [
+        idx
+        for idx, info in enumerate(infos)
+        if (info is not None) and (info.total_frames is not None)
+    ]
+    # The frames selected by the modes that depend on the content of the
+    # videos are computed by the workers, while decoding them
+    content = spec.mode in _CONTENT_MODES
+    if (spec.num_frames is not None) and known and (not content):
+        indices = plan_indices(
+            [infos[idx].total_frames for idx in known],
+            spec.num_frames,
+            mode=spec.mode,
+            fps=[infos[idx].fps for idx in known],
+            random_state=spec.random_state,
+            keys=[keys[idx] for idx in known],
+        )
+        for idx, video_indices in zip(known, indices):
+            all_indices[idx] = video_indices
+    return [
+        _Task(source, info, key, indices)
+        for source, info, key, indices in zip(sources, infos, keys, all_indices)
+    ]
+
+
+def _video_key(source, idx):
+    """Used internally to get the key of a video: its name if it has one,
+    or else its position."""
+    name = _source_name(source)
+    return name if name is not None else idx
+
+
+# The configuration of the reader, in a worker process
+_worker_spec = None
+
+
+def _init_worker(spec):
+    """Used internally as the initializer of the worker processes."""
+    global _worker_spec
+    _worker_spec = spec
+
+
+def _run_task(func, task):
+    """Used internally to run a task in a worker process."""
+    return func(_worker_spec, task)
+
+
+def _probe_task(spec, source):
+    """Used internally to get the meta-data of a video, with the backend of
+    the reader."""
+    return _retry(spec, spec.backend.probe, source)
+
+
+def _decode_task(spec, task):
+    """Used internally to read in a video, with the backend of the reader.
+
+    Returns the video and its meta-data. A video that is not a file is
+    loaded only once: if its meta-data is not known, it is probed from the
+    same data that is then decoded.
+
+    """
+    return _retry(spec, _decode_source, task)
+
+
+def _decode_source(spec, task):
+    """Used internally by :func:`_decode_task()` to probe (if needed) and
+    decode a video, with the backend of the reader."""
+    with _open_source(task.source) as opened:
+        task = task._replace(source=opened)
+        if task.info is None:
+            task = task._replace(info=spec.backend.probe(spec, opened))
+        video, _ = spec.backend.decode(spec, task)
+    return video, task.info
+
+
+def _probe_paths(pool, spec, sources, func=_probe_task):
+    """Used internally to probe the videos that are files, before reading
+    them. The other videos are probed while being read (see
+    :func:`_decode_task()`), so that they are loaded (and sent to a worker)
+    only once. Their meta-data is `None`."""
+    paths = [source for source in sources if isinstance(source, str)]
+    infos = iter(_map_tasks(pool, func, spec, paths, True))
+    return [next(infos) if isinstance(source, str) else None for source in sources]
+
+
+def _retry(spec, func, task):
+    """Used internally to run ``func(spec, task)``, retrying it (up to
+    ``spec.retries`` times) if it fails with a transient error."""
+    errors = spec.backend.transient_errors()
+    for _ in range(spec.retries):
+        try:
+            return func(spec, task)
+        except errors:
+            pass
+    return func(spec, task)
+
+
+def _indexed(func, item):
+    """Used internally to run a task, and return its result along with the
+    index of the task."""
+    idx, task = item
+    return idx, func(task)
+
+
+@contextmanager
+def _worker_pool(spec, workers, sources=()):
+    """Used internally to start the worker processes, if ``workers`` is
+    greater than 0 (or ``"auto"``).
+
+    This uses the ``multiprocessing`` module present in the python
+    standard library. The ``spec`` is sent to each worker process only
+    once, when it is started. The workers are forked where possible
+    (whatever the default start method), so that the ``spec`` is
+    inherited rather than pickled. If the backend of the reader decodes the
+    videos without holding the GIL, threads are used instead.
+
+    Yields
+    ------
+    :obj:`multiprocessing.pool.Pool`
+        The pool of workers, or `None` if ``workers`` is 0. If ``workers``
+        is ``"auto"``, the pool is a :obj:`_TunedPool`, and the number of
+        workers is the one tuned for the ``sources`` (if known).
+
+    """
+    tuned = workers == "auto"
+    if not (tuned or ((isinstance(workers, int)) and (workers > 0))):
+        yield None
+        return
+
+    from multiprocessing import cpu_count, get_all_start_methods, get_context
+    from multiprocessing.pool import ThreadPool
+
+    max_workers = cpu_count()
+    if tuned:
+        key = _tuning_key(spec, sources)
+        tuning = _load_tuning().get(key, {})
+        workers = _tuned_workers(tuning, max_workers)
+    if workers > max_workers:
+        warnings.warn(f"The CPU can support maximum {max_workers} workers.")
+        workers = max_workers
+    if _uses_threads(spec):
+        pool = ThreadPool(workers)
+    else:
+        method = "fork" if "fork" in get_all_start_methods() else None
+        pool = get_context(method).Pool(
+            workers, initializer=_init_worker, initargs=(spec,)
+        )
+    with pool:
+        if tuned:
+            pool = _TunedPool(pool, workers, max_workers, key, tuning)
+        yield pool
+
+
+class _TunedPool(object):
+    """Used internally for ``workers="auto"``: a pool of workers that tunes
+    the number of workers and the chunksize of the tasks.
+
+    The first few tasks of each kind (for example, probing or decoding)
+    are sent to the workers one at a time. For these, the time taken by a
+    worker to run a task is compared with the time taken per task overall,
+    which includes the transfer of the results and their processing (such
+    as copying) in the parent. The remaining tasks are then sent in chunks
+    that take about ``CHUNK_TIME`` seconds to run.
+
+    The part of the time per task that is spent outside of the workers
+    does not decrease with more workers, and limits the number of workers
+    that are useful. The measurements are cached (see
+    :func:`_tuning_path()`), so that the next reads of the same videos (or
+    videos in the same directory) with the same reader start with the
+    right number of workers, and skip the measurements.
+
+    """
+
+    def __init__(self, pool, workers, max_workers, key, tuning):
+        self.pool = pool
+        self.workers = workers
+        self.max_workers = max_workers
+        self.key = key
+        self.tuning = tuning
+
+    def imap(self, func, tasks, name, ordered=True):
+        """Same as :func:`multiprocessing.pool.Pool.imap` (or
+        :func:`multiprocessing.pool.Pool.imap_unordered`, if ``ordered`` is
+        `False`). The ``name`` of the kind of tasks is used to cache their
+        measurements."""
+        tasks = list(tasks)
+        measured = self.tuning.get(name)
+        if measured is None:
+            num_tasks = min(len(tasks), 2 * self.workers)
+            times = []
+            start = time.perf_counter()
+            for result, elapsed in self.pool.imap(
+                partial(_timed, func), tasks[:num_tasks]
+            ):
+                times.append(elapsed)
+                yield result
+            if num_tasks > 0:
+                task_time = float(np.median(times))
+                wall_time = (time.perf_counter() - start) / num_tasks
+                measured = {
+                    "task_time": task_time,
+                    "overhead": max(wall_time - (task_time / self.workers), 0.0),
+                }
+                self.tuning[name] = measured
+                _save_tuning(self.key, self.tuning)
+            tasks = tasks[num_tasks:]
+        if not tasks:
+            return
+
+        chunksize = max(1, int(CHUNK_TIME / max(measured["task_time"], 1e-6)))
+        # Each worker should still get a few chunks, to balance the load
+        chunksize = min(chunksize, max(1, len(tasks) // (4 * self.workers)))
+        if ordered:
+            yield from self.pool.imap(func, tasks, chunksize=chunksize)
+        else:
+            yield from self.pool.imap_unordered(func, tasks, chunksize=chunksize)
+
+
+def _timed(func, task):
+    """Used internally to run a task, and measure the time taken (in
+    seconds) by the worker."""
+    start = time.perf_counter()
+    result = func(task)
+    return result, time.perf_counter() - start
+
+
+def _tuned_workers(tuning, max_workers):
+    """Used internally to get the number of workers for ``workers="auto"``
+    from the measurements of the previous reads (all the CPUs if there
+    are none)."""
+    measured = tuning.get("_decode_task")
+    if (measured is None) or (measured["overhead"] <= 0):
+        return max_workers
+    # Beyond this, the workers would be waiting for the parent
+    useful = int(np.ceil(measured["task_time"] / measured["overhead"]))
+    return int(np.clip(useful, 1, max_workers))
+
+
+def _tuning_key(spec, sources):
+    """Used internally to identify the videos being read (by the directory
+    they are in) and the configuration of the reader, in the cache of
+    ``workers="auto"``."""
+    specs = (spec,) if isinstance(spec, ReaderSpec) else spec
+    settings = [
+        spec._replace(
+            mode=_qualified_name(spec.mode),
+            random_state=None,
+            backend=spec.backend.name or _qualified_name(type(spec.backend)),
+        )
+        for spec in specs
+    ]
+    # A sample of the paths is enough to find the directory of the videos
+    names = [source for source in sources[:1000] if isinstance(source, str)]
+    corpus = None
+    if names:
+        corpus = os.path.commonpath(
+            [os.path.dirname(os.path.abspath(name)) for name in names]
+        )
+    key = json.dumps([repr(settings), corpus])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _qualified_name(func):
+    """Used internally to name a callable in the same way in every run (its
+    `repr` may include its address in memory). Callable objects without a
+    name (such as :func:`functools.partial`) are named by their type."""
+    if not hasattr(func, "__qualname__"):
+        func = type(func)
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def _tuning_path():
+    """Used internally to get the path of the cache of ``workers="auto"``,
+    in ``$XDG_CACHE_HOME/mydia`` (``~/.cache/mydia`` by default)."""
+    root = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(root, "mydia", "autotune.json")
+
+
+def _load_tuning():
+    """Used internally to read the cache of ``workers="auto"``."""
+    try:
+        with open(_tuning_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_tuning(key, tuning):
+    """Used internally to (atomically) update the cache of
+    ``workers="auto"``. Failing to write it is not an error."""
+    path = _tuning_path()
+    cache = _load_tuning()
+    cache[key] = tuning
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(cache, f)
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+
+
+def _uses_threads(spec):
+    """Used internally to check if the videos should be read with threads
+    (instead of processes), see :attr:`mydia.backends.Backend.threads`."""
+    return getattr(getattr(spec, "backend", None), "threads", False)
+
+
+def _map_tasks(pool, func, spec, tasks, disable, ordered=True):
+    """Used internally to run ``func(spec, task)`` for each task.
+
+    The tasks are run by the workers of ``pool`` if it is not `None`, in a
+    way so as to guarantee the reproducibility of the results, irrespective
+    of the `mode` used for frame selection.
+
+    Yields
+    ------
+    object
+        The result of each task, in the order of ``tasks``. If ``ordered``
+        is `False`, tuples of the index of the task and its result are
+        yielded as soon as each task completes, so that a slow task does
+        not hold back the results of the others.
+
+    """
+    call = partial(func, spec)
+    if (pool is not None) and (not _uses_threads(spec)):
+        # The worker processes already have the `spec`
+        call = partial(_run_task, func)
+    if not ordered:
+        call = partial(_indexed, call)
+        tasks = list(enumerate(tasks))
+
+    if pool is None:
+        results = map(call, tasks)
+    elif isinstance(pool, _TunedPool):
+        results = pool.imap(call, tasks, func.__name__, ordered)
+    elif ordered:
+        results = pool.imap(call, tasks)
+    else:
+        results = pool.imap_unordered(call, tasks)
+    if disable:
+        yield from results
+        return
+
+    with _make_progress_bar(total=len(tasks), unit="videos") as pbar:
+        for result in results:
+            yield result
+            pbar.update()
+
+
+# The progress bar used while reading the videos, see `set_progress_bar()`
+_progress_bar = None
+
+
+def set_progress_bar(progress_bar):
+    """Sets the progress bar shown while reading the videos (if ``verbose``
+    is not 0).
+
+    Parameters
+    ----------
+    progress_bar : callable
+        Called with the keyword arguments ``total`` and ``unit``, it should
+        return a context manager with an ``update()`` method, that is
+        called once for every video read. For example, ``tqdm.tqdm`` (the
+        default) or ``tqdm.auto.tqdm``. If set to `None`, the default is
+        restored.
+
+    Example
+    -------
+    .. code-block:: python
+
+       from tqdm.notebook import tqdm
+       from mydia import set_progress_bar
+
+       set_progress_bar(tqdm)
+
+    """
+    global _progress_bar
+    _progress_bar = progress_bar
+
+
+def _make_progress_bar(**kwargs):
+    """Used internally to create the progress bar, ``tqdm`` is imported only
+    if it is needed."""
+    if _progress_bar is not None:
+        return _progress_bar(**kwargs)
+
+    from tqdm import tqdm
+
+    return tqdm(**kwargs)
+
+
+def _estimate_nbytes(spec, infos, variable_size=None):
+    """Used internally by :func:`Videos.read()` to estimate the size (in
+    bytes) of the output, from the meta-data of the videos. The videos
+    whose meta-data is not known yet (those that are not files) are
+    counted as the average of the others."""
+    itemsize = np.dtype(spec.dtype if spec.normalize else np.uint8).itemsize
+    shapes = []
+    for info in infos:
+        if info is None:
+            continue
+        num_frames = _expected_frames(spec, info)
+        shapes.append((num_frames or 0,) + _frame_shape(spec, info.target_size))
+    if not shapes:
+        return 0
+
+    shapes = np.array(shapes, dtype=np.int64)
+    if variable_size == "pad":
+        return int(len(infos) * np.prod(np.max(shapes, axis=0)) * itemsize)
+    return int(np.mean(np.prod(shapes, axis=1)) * len(infos) * itemsize)
+
+
+def _expected_frames(spec, info):
+    """Used internally to get the number of frames that are read from a
+    video, from its meta-data. If the total number of frames is not known
+    (as for most MKV and WebM files), it is estimated from the duration,
+    unless frames are skipped by the decoder. Returns `None` if it cannot
+    be estimated."""
+    num_frames = spec.num_frames
+    if num_frames is None:
+        # Some containers report 0 frames when the number is not known
+        num_frames = info.total_frames or None
+    if (
+        (num_frames is None)
+        and (info.duration is not None)
+        and (spec.skip_frame is None)
+    ):
+        num_frames = int(np.ceil(info.duration * info.fps))
+    return num_frames
+
+
+def _available_memory():
+    """Used internally to get the memory (in bytes) available for new
+    allocations, or `None` if it cannot be determined."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def _open_spill(spill_path, shape, dtype):
+    """Used internally by :func:`Videos.read()` to create the memory-mapped
+    ``.npy`` file that the videos are written to."""
+    if spill_path is not None:
+        return np.lib.format.open_memmap(
+            spill_path, mode="w+", dtype=dtype, shape=shape
+        )
+
+    fd, temp_path = tempfile.mkstemp(prefix="mydia-", suffix=".npy")
+    os.close(fd)
+    video_tensor = np.lib.format.open_memmap(
+        temp_path, mode="w+", dtype=dtype, shape=shape
+    )
+    # The mapping stays valid after the file is removed, and the disk space
+    # is freed along with the tensor. This is not possible on Windows, where
+    # the file is left in the temporary directory.
+    try:
+        os.remove(temp_path)
+    except OSError:
+        pass
+    return video_tensor
+
+
+def _decode_video(spec, task):
+    """Used internally by :func:`Videos.read()` to read in a **single** video.
+
+    Parameters
+    ----------
+    spec : :obj:`ReaderSpec`
+        The configuration of the reader.
+    task : :obj:`_Task`
+        The video to be read (a path, ``bytes`` or an
+        :obj:`ArchiveMember`), and what is already known about it.
+
+    Returns
+    -------
+    tuple[:obj:`numpy.ndarray`, :obj:`TargetSize`]
+        A 5-dimensional tensor of shape
+        ``(1, <frames>, <height>, <width>, <channels>)``, and the size of
+        its frames.
+
+    """
+    with _open_source(task.source) as opened:
+        if task.info is None:
+            task = task._replace(info=_probe_video(spec, opened))
+        out, _, target_size = _build_stream(spec, opened, task)
+        max_bytes = _max_output(spec, task.info)
+
+        out = out.output("pipe:", vsync=0, format="rawvideo", pix_fmt=spec.pix_fmt)
+        out = out.global_args("-loglevel", "error", "-hide_banner")
+        out = _run(out, opened, timeout=spec.timeout, max_bytes=max_bytes)
+
+    return _to_video(spec, out, target_size), target_size
+
+
+def _decode_multi(specs, task):
+    """Used internally by :func:`read_multi()` to read in a **single** video
+    with several readers, decoding it only once.
+
+    The decoded frames are split (with the ``split`` filter of FFmpeg)
+    into one branch per reader, and each branch is written to an output
+    of its own.
+
+    Parameters
+    ----------
+    specs : tuple[:obj:`ReaderSpec`]
+        The configuration of each reader.
+    task : tuple[object, tuple[:obj:`_Task`]]
+        The video to be read, and its task for each reader.
+
+    Returns
+    -------
+    list[:obj:`numpy.ndarray`]
+        The video as read by each reader, a 5-dimensional tensor of shape
+        ``(1, <frames>, <height>, <width>, <channels>)``.
+
+    """
+    import ffmpeg
+
+    source, tasks = task
+    with _open_source(source) as opened:
+        if tasks[0].info is None:
+            infos = _probe_multi(specs, opened)
+            tasks = [task._replace(info=info) for task, info in zip(tasks, infos)]
+        tasks = [
+            _content_indices(spec, opened, task) for spec, task in zip(specs, tasks)
+        ]
+        stream = _input_stream(specs[0], opened)
+        if len(specs) > 1:
+            stream = stream.filter_multi_output("split", len(specs))
+            branches = [stream[idx] for idx in range(len(specs))]
+        else:
+            branches = [stream]
+        branches = [
+            _filter_stream(spec, branch, task)
+            for spec, branch, task in zip(specs, branches, tasks)
+        ]
+
+        def make_stream(filenames):
+            outputs = [
+                branch.output(
+                    filename, vsync=0, format="rawvideo", pix_fmt=spec.pix_fmt
+                )
+                for spec, (branch, _, _), filename in zip(specs, branches, filenames)
+            ]
+            out = ffmpeg.merge_outputs(*outputs)
+            return out.global_args("-loglevel", "error", "-hide_banner")
+
+        max_bytes = [_max_output(spec, task.info) for spec, task in zip(specs, tasks)]
+        outputs = _run_outputs(
+            make_stream,
+            opened,
+            len(specs),
+            timeout=specs[0].timeout,
+            max_bytes=max_bytes,
+        )
+
+    return [
+        _to_video(spec, out, target_size)
+        for spec, out, (_, _, target_size) in zip(specs, outputs, branches)
+    ]
+
+
+def _max_output(spec, info):
+    """Used internally to get the maximum size (in bytes) of the output of
+    FFmpeg for a video, from its expected number of frames. It is
+    ``MAX_OUTPUT`` if the number of frames cannot be estimated."""
+    num_frames = _expected_frames(spec, info)
+    if not num_frames:
+        return MAX_OUTPUT
+    frame_bytes = int(np.prod(_frame_shape(spec, info.target_size)))
+    return (OUTPUT_MARGIN * num_frames + 1) * frame_bytes
+
+
+def _to_video(spec, out, target_size):
+    """Used internally to convert the raw output of FFmpeg to a video, of
+    shape ``(1, <frames>, <height>, <width>, <channels>)``."""
+    video = np.frombuffer(out, np.uint8).reshape(
+        (-1,) + _frame_shape(spec, target_size)
+    )
+
+    if spec.normalize:
+        min_, max_ = np.min(video), np.max(video)
+        video = np.clip(video, min_, max_)
+        video = (video.astype(spec.dtype) - min_) / (max_ - min_ + 1e-5)
+
+    return np.expand_dims(video, axis=0)
+
+
+def _frame_shape(spec, target_size):
+    """Used internally to get the shape ``(<height>, <width>, <channels>)``
+    of the frames of a video, in the pixel format of the reader."""
+    if spec.pix_fmt == "yuv420p":
+        # The chroma planes are stacked below the luma plane
+        return (target_size.height * 3 // 2, target_size.width, 1)
+    return (target_size.height, target_size.width, NUM_CHANNELS[spec.pix_fmt])
+
+
+def _check_even(target_size):
+    """Used internally to check that the frames can be subsampled in the
+    ``"yuv420p"`` pixel format."""
+    if (target_size.width % 2) or (target_size.height % 2):
+        raise ValueError(
+            "The width and the height of the frames must be even for "
+            f"'yuv420p', got ({target_size.width}, {target_size.height}). Set "
+            "'target_size' to resize them"
+        )
+
+
+def _decode_grid(spec, task):
+    """Used internally by :func:`contact_sheet()` to make the grid of
+    frames of a **single** video, with FFmpeg.
+
+    Parameters
+    ----------
+    spec : :obj:`ReaderSpec`
+        The configuration of the reader.
+    task : tuple[:obj:`_Task`, int, int, str]
+        The video to be read, the number of columns in the
+        grid, the amount of padding (in pixels) and the path of the image
+        file to write the grid to. If the latter is `None`, the grid is
+        returned instead.
+
+    Returns
+    -------
+    :obj:`numpy.ndarray`
+        The grid of frames, of shape ``(1, <height>, <width>, <channels>)``
+        or `None` if the grid is written to a file.
+
+    """
+    task, num_col, padding, output = task
+    with _open_source(task.source) as opened:
+        out, num_frames, target_size = _build_stream(spec, opened, task)
+        if num_frames is None:
+            raise ValueError(
+                "The total number of frames of the video is not known, "
+                "set 'num_frames' to make its grid"
+            )
+        num_row = int(np.ceil(num_frames / num_col))
+        height = (num_row * (target_size.height + padding)) + padding
+        width = (num_col * (target_size.width + padding)) + padding
+
+        # The frames are converted before being tiled, so that the padding
+        # is exact (and black) irrespective of the chroma subsampling
+        out = out.filter("format", spec.pix_fmt)
+        out = out.filter(
+            "tile",
+            layout=f"{num_col}x{num_row}",
+            margin=padding,
+            padding=padding,
+            color="black",
+        )
+        if output is not None:
+            out = out.output(output, vframes=1)
+            out = out.global_args("-loglevel", "error", "-hide_banner", "-y")
+            _run(out, opened, timeout=spec.timeout)
+            return None
+
+        out = out.output("pipe:", vframes=1, format="rawvideo", pix_fmt=spec.pix_fmt)
+        out = out.global_args("-loglevel", "error", "-hide_banner")
+        out = _run(out, opened, timeout=spec.timeout)
+    grid = np.frombuffer(out, np.uint8).reshape(
+        [1, height, width, NUM_CHANNELS[spec.pix_fmt]]
+    )
+
+    return grid
+
+
+def _build_stream(spec, opened, task):
+    """Used internally to set up the decoding of a **single** video.
+
+    The video is probed, and the frame selection and resizing filters
+    are applied to its stream.
+
+    Parameters
+    ----------
+    spec : :obj:`ReaderSpec`
+        The configuration of the reader.
+    opened : :obj:`_OpenedSource`
+        The video to be read, see :func:`_open_source()`.
+    task : :obj:`_Task`
+        What is already known about the video. The video is probed, and
+        the frames to select are computed, if they are not known.
+
+    Returns
+    -------
+    tuple[:obj:`ffmpeg.nodes.FilterableStream`, int, :obj:`TargetSize`]
+        The stream of the selected (and resized) frames, the number of
+        frames in it and their size. The number of frames is `None` if all
+        the frames are kept and the total number of frames is not known.
+
+    """
+    if task.info is None:
+        task = task._replace(info=_probe_video(spec, opened))
+    task = _content_indices(spec, opened, task)
+    out = _input_stream(spec, opened)
+    return _filter_stream(spec, out, task)
+
+
+def _content_indices(spec, opened, task):
+    """Used internally to compute the indices of the frames to select, for
+    the modes that depend on the content of the video (see ``"scene"``).
+
+    The video is decoded (at a low resolution) by FFmpeg, to compute the
+    scene change score of each of its frames. This is a pass over the whole
+    video on top of the one that decodes the selected frames.
+
+    Returns
+    -------
+    :obj:`_Task`
+        The task, with the indices of the frames to select.
+
+    """
+    if (
+        (spec.num_frames is None)
+        or (task.indices is not None)
+        or (spec.mode not in _CONTENT_MODES)
+    ):
+        return task
+
+    out = _input_stream(spec, opened)
+    out = out.filter("scale", SCENE_WIDTH, -2)
+    # The scene score is only computed by the `select` filter
+    out = out.filter("select", "gte(scene,0)")
+    out = out.filter("metadata", mode="print", key="lavfi.scene_score", file="-")
+    out = out.output("-", format="null")
+    out = out.global_args("-loglevel", "error", "-hide_banner")
+    out = _run(out, opened, timeout=spec.timeout).decode("utf-8")
+    scores = [
+        float(line.split("=", 1)[1])
+        for line in out.splitlines()
+        if line.startswith("lavfi.scene_score=")
+    ]
+
+    if spec.num_frames > len(scores):
+        raise IndexError(
+            "The value of 'num_frames' is greater than the total "
+            "number of frames available"
+        )
+    indices = spec.mode(len(scores), spec.num_frames, task.info.fps, scores)
+    return task._replace(indices=indices)
+
+
+def _input_stream(spec, opened):
+    """Used internally to make the input stream of a video, with the
+    options of the decoder."""
+    import ffmpeg
+
+    input_args = {}
+    if spec.skip_frame is not None:
+        input_args["skip_frame"] = spec.skip_frame
+    if spec.lowres > 0:
+        input_args["lowres"] = spec.lowres
+    return ffmpeg.input(filename=opened.filename, **input_args)
+
+
+def _filter_stream(spec, out, task):
+    """Used internally to apply the frame selection and resizing filters to
+    the stream of a video, whose meta-data is known.
+
+    Returns the same as :func:`_build_stream()`.
+
+    """
+    fps, total_frames, target_size = task.info[:3]
+    if spec.num_frames is not None:
+        indices = task.indices
+        if indices is None:
+            assert total_frames is not None
+            indices = plan_indices(
+                [total_frames],
+                spec.num_frames,
+                mode=spec.mode,
+                fps=[fps],
+                random_state=spec.random_state,
+                keys=[task.key],
+            )[0]
+        select_str = "+".join([f"eq(n,{idx})" for idx in indices])
+        out = out.filter("select", select_str)
+
+    if target_size.rescale:
+        out = out.filter("scale", target_size.width, target_size.height)
+
+    if spec.num_frames is not None:
+        total_frames = spec.num_frames
+
+    return out, total_frames, target_size
+
+
+def _probe_video(spec, source):
+    """Used internally to get the meta-data of a **single** video.
+
+    Parameters
+    ----------
+    spec : :obj:`ReaderSpec`
+        The configuration of the reader.
+    source : str
+        The video to be read (a path, ``bytes``, an :obj:`ArchiveMember`
+        or an :obj:`_OpenedSource`).
+
+    Returns
+    -------
+    :obj:`VideoInfo`
+        Frame rate and the total number of frames in the video, the size
+        its frames will be read at, its dimensions and its duration (in
+        seconds). If ``skip_frame`` is set, the total number of frames is
+        the number of frames that will actually be decoded. The size is
+        the `default` dimensions of the video, if the frames are not to
+        be resized.
+
+    """
+    return _video_info(spec, _probe_source(spec, source))
+
+
+def _probe_multi(specs, source):
+    """Used internally by :func:`read_multi()` to get the meta-data of a
+    **single** video for several readers, probing it only once.
+
+    Returns
+    -------
+    list[:obj:`VideoInfo`]
+        The meta-data of the video for each reader.
+
+    """
+    # The readers have the same `skip_frame`, see `read_multi()`
+    probe = _probe_source(specs[0], source)
+    return [_video_info(spec, probe) for spec in specs]
+
+
+def _probe_source(spec, source):
+    """Used internally to run ``ffprobe`` on a video, with the options
+    needed by the reader. Raises an :obj:`FFmpegError` (with the errors
+    logged by ``ffprobe``) if it fails to read the video."""
+    probe_args = {}
+    if spec.skip_frame is not None:
+        # The frames that are skipped by the decoder are not counted
+        # in 'nb_frames', so they have to be counted by decoding the
+        # remaining ones (to select frames among them, and to estimate
+        # the size of the output). For "nokey" this is only the key
+        # frames.
+        probe_args = {
+            "select_streams": "v:0",
+            "skip_frame": spec.skip_frame,
+            "count_frames": None,
+        }
+    with _open_source(source) as opened:
+        return _probe(opened, timeout=spec.timeout, **probe_args)
+
+
+def _video_info(spec, probe):
+    """Used internally to get the meta-data of a video from the output of
+    ``ffprobe``, see :func:`_probe_video()`."""
+    video_stream = next(
+        (stream for stream in probe["streams"] if stream["codec_type"] == "video"),
+        None,
+    )
+
+    # If the frame rate is 25, then the 'avg_frame_rate' is of
+    # the form `25/1`
+    fps = int(video_stream["avg_frame_rate"].split("/")[0])
+
+    try:
+        if "nb_read_frames" in video_stream:
+            total_frames = int(video_stream["nb_read_frames"])
+        else:
+            total_frames = int(video_stream["nb_frames"])
+    except KeyError:
+        total_frames = None
+
+    target_size = spec.target_size
+    if target_size is None:
+        # The decoder rounds up the dimensions when `lowres` is set.
+        # Rescaling to the same size makes the output independent of
+        # whether the codec actually supports `lowres` or not.
+        target_size = TargetSize(
+            width=-(-video_stream["width"] >> spec.lowres),
+            height=-(-video_stream["height"] >> spec.lowres),
+            rescale=spec.lowres > 0,
+        )
+        if spec.pix_fmt == "yuv420p":
+            _check_even(target_size)
+
+    duration = video_stream.get("duration", probe["format"].get("duration"))
+    if duration is not None:
+        duration = float(duration)
+
+    return VideoInfo(
+        fps=fps,
+        total_frames=total_frames,
+        target_size=target_size,
+        width=video_stream["width"],
+        height=video_stream["height"],
+        duration=duration,
+    )
+
+
+def plan_indices(
+    total_frames, num_frames, mode="auto", fps=None, random_state=17, keys=None
+):
+    """Computes the indices of the frames to select, for many videos at once.
+
+    This is what :class:`Videos` uses to select the frames of the videos,
+    once their total number of frames is known. For the built-in modes,
+    the indices of all the videos are computed in a single vectorized
+    call.
+
+    Parameters
+    ----------
+    total_frames : list[int] or :obj:`numpy.ndarray`
+        The total number of frames of each video.
+    num_frames : int
+        The number of frames to select from each video.
+    mode : str or callable
+        The method used for frame selection, defaults to "auto". Same as
+        for :class:`Videos`.
+    fps : list[int] or :obj:`numpy.ndarray`
+        The frame rate of each video, defaults to `None`. Only used by
+        custom modes.
+    random_state : int
+        Integer that seeds the (numpy) random number generator, defaults
+        to 17.
+    keys : list
+        The key of each video (its path, or any other integer or string
+        that identifies it), defaults to `None`, in which case the
+        position of the video is used. The seed of each video is derived
+        from ``random_state`` and its key, so that the frames selected for
+        a video do not depend on the other videos.
+
+    Returns
+    -------
+    :obj:`numpy.ndarray`
+        The indices, of shape ``(<videos>, <num_frames>)``.
+
+    Raises
+    ------
+    IndexError
+        If ``num_frames`` is greater than the total number of frames
+        available in any of the videos.
+    ValueError
+        If ``mode`` depends on the content of the videos (``"scene"``).
+
+    Example
+    -------
+    .. code-block:: python
+
+       import numpy as np
+       from mydia import plan_indices
+
+       total_frames = np.array([132, 300, 48])
+       indices = plan_indices(total_frames, 16, mode="random")
+
+    """
+    if isinstance(mode, str):
+        mode = MODES[mode]
+    if mode in _CONTENT_MODES:
+        raise ValueError(
+            "The frames selected by this mode depend on the content of the "
+            "videos, and cannot be computed from their meta-data"
+        )
+    total_frames = np.asarray(total_frames, dtype=np.int64).reshape(-1)
+    if fps is None:
+        fps = np.zeros(len(total_frames), dtype=np.int64)
+    fps = np.asarray(fps).reshape(-1)
+    if keys is None:
+        keys = range(len(total_frames))
+
+    if np.any(num_frames > total_frames):
+        raise IndexError(
+            "The value of 'num_frames' is greater than the total "
+            "number of frames available"
+        )
+
+    seeds = None
+    if (mode in _SEEDED_MODES) or (mode not in _BATCHED_MODES):
+        seeds = _video_seeds(random_state, list(keys))
+
+    if mode in _BATCHED_MODES:
+        return _BATCHED_MODES[mode](total_frames, num_frames, fps, seeds)
+
+    indices = np.empty((len(total_frames), num_frames), dtype=np.int64)
+    for idx, (total, fps_, seed) in enumerate(
+        zip(total_frames.tolist(), fps.tolist(), seeds.tolist())
+    ):
+        selected = mode(total, num_frames, fps_, seed)
+        assert len(selected) == num_frames, _NUM_FRAMES_MISMATCH
+        indices[idx] = selected
+    return indices
+
+
+def shard_indices(infos, rank, world_size):
+    """Splits videos into ``world_size`` shards of (about) the same cost,
+    and returns the shard of ``rank``.
+
+    The cost of decoding a video is estimated as its number of frames
+    times its number of pixels (at its own resolution). The videos are
+    assigned, from the most to the least costly, to the shard with the
+    lowest total cost so far (the "longest processing time" rule). This
+    only depends on ``infos``, so every node computes the same shards,
+    without any communication.
+
+    Parameters
+    ----------
+    infos : list[:obj:`VideoInfo`]
+        The meta-data of the videos (the probe index), in the same order
+        on every node. See :func:`Videos.probe`. Videos whose meta-data is
+        `None` are assumed to cost nothing.
+    rank : int
+        The index of the shard to return, from 0 to ``world_size - 1``.
+    world_size : int
+        The number of shards (for example, the number of nodes).
+
+    Returns
+    -------
+    :obj:`numpy.ndarray`
+        The (sorted) indices of the videos in the shard.
+
+    Raises
+    ------
+    ValueError
+        If ``rank`` is not in the range ``[0, world_size)``.
+
+    Example
+    -------
+    .. code-block:: python
+
+       from mydia import Videos, shard_indices
+
+       reader = Videos(target_size=(224, 224), num_frames=16, mode="random")
+       infos = reader.probe(paths, workers=8)
+
+       indices = shard_indices(infos, rank, world_size)
+       videos = reader.read([paths[idx] for idx in indices], workers=8)
+
+    Note
+    ----
+    The frames selected by ``mode="random"`` are the same whichever shard
+    a video is read in, since the seed of a video is derived from its
+    path. This is not the case for videos given as ``bytes``, whose seed
+    depends on their position in ``paths``.
+
+    """
+    if not ((isinstance(world_size, int)) and (world_size > 0)):
+        raise ValueError("Invalid value of 'world_size'")
+    if not ((isinstance(rank, int)) and (0 <= rank < world_size)):
+        raise ValueError("Invalid value of 'rank'")
+
+    costs = np.array([_video_cost(info) for info in infos], dtype=np.float64)
+    # Most costly first, ties broken by the position of the video
+    order = np.argsort(-costs, kind="stable")
+    heap = [(0.0, shard) for shard in range(world_size)]
+    shards = np.empty(len(costs), dtype=np.int64)
+    for idx in order.tolist():
+        load, shard = heapq.heappop(heap)
+        shards[idx] = shard
+        heapq.heappush(heap, (load + costs[idx], shard))
+
+    return np.flatnonzero(shards == rank)
+
+
+def _video_cost(info):
+    """Used internally to estimate the cost of decoding a video from its
+    meta-data: its number of frames times its number of pixels."""
+    if info is None:
+        return 0.0
+    num_frames = info.total_frames
+    if (num_frames is None) and (info.duration is not None):
+        num_frames = np.ceil(info.duration * info.fps)
+    return float(num_frames or 1) * info.width * info.height
+
+
+class RaggedVideos(object):
+    """A batch of videos of different dimensions ``(frames, height, width)``.
+
+    All the videos are stored one after the other in a single contiguous
+    (1-dimensional) buffer. Indexing the batch returns a view of a video,
+    of shape ``(<frames>, <height>, <width>, <channels>)`` (or
+    ``(<channels>, <frames>, <height>, <width>)`` for ``"channels_first"``).
+
+    Parameters
+    ----------
+    data : :obj:`numpy.ndarray`
+        The 1-dimensional buffer with all the videos.
+    offsets : :obj:`numpy.ndarray`
+        The offset of each video in ``data``, followed by the size of
+        ``data``.
+    shapes : :obj:`numpy.ndarray`
+        The ``(frames, height, width, channels)`` of each video.
+    data_format : str
+        Video data format, either "channels_last" or "channels_first".
+
+    Example
+    -------
+    .. code-block:: python
+
+       from mydia import Videos
+
+       reader = Videos(variable_size="ragged")
+       videos = reader.read(["./path/to/video_1", "./path/to/video_2"])
+
+       for video in videos:
+           print(video.shape)
+
+    """
+
+    def __init__(self, data, offsets, shapes, data_format="channels_last"):
+        self.data = data
+        self.offsets = offsets
+        self.shapes = shapes
+        self.data_format = data_format
+
+    @classmethod
+    def from_videos(cls, videos, data_format="channels_last"):
+        """Copies a list of ``"channels_last"`` videos into a single buffer.
 
         Parameters
         ----------
-        path : str
-            The path of the video to be read.
+        videos : list[:obj:`numpy.ndarray`]
+            The 4-dimensional videos.
+        data_format : str
+            Video data format of the batch, either "channels_last" or
+            "channels_first".
 
         Returns
         -------
-        tuple[int, int]
-            Frame rate and the total number of frames in the video.
+        :obj:`RaggedVideos`
 
         """
-        try:
-            probe = ffmpeg.probe(filename=path)
-        except Exception as e:
-            # The exception returned by `ffprobe` is in bytes
-            print(e.stderr.decode())
-        else:
-            video_stream = next(
-                (
-                    stream
-                    for stream in probe["streams"]
-                    if stream["codec_type"] == "video"
-                ),
-                None,
-            )
+        shapes = np.array([video.shape for video in videos], dtype=np.int64)
+        shapes = shapes.reshape(-1, 4)
+        offsets = np.zeros(len(videos) + 1, dtype=np.int64)
+        np.cumsum(np.prod(shapes, axis=1), out=offsets[1:])
+        dtype = videos[0].dtype if videos else np.uint8
+        data = np.empty(offsets[-1], dtype=dtype)
+        for idx, video in enumerate(videos):
+            data[offsets[idx] : offsets[idx + 1]] = video.ravel()
+
+        return cls(data, offsets, shapes, data_format)
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def __getitem__(self, idx):
+        if not -len(self) <= idx < len(self):
+            raise IndexError("Index out of range")
+        idx = idx % len(self)
+        video = self.data[self.offsets[idx] : self.offsets[idx + 1]]
+        video = video.reshape(self.shapes[idx])
+        if self.data_format == "channels_first":
+            video = np.transpose(video, axes=(3, 0, 1, 2))
+        return video
 
-            # If the frame rate is 25, then the 'avg_frame_rate' is of
-            # the form `25/1`
-            fps = int(video_stream["avg_frame_rate"].split("/")[0])
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
 
-            try:
-                total_frames = int(video_stream["nb_frames"])
-            except KeyError:
-                total_frames = None
 
-            if self.target_size is None:
-                self.target_size = TargetSize(
-                    width=video_stream["width"], height=video_stream["height"]
-                )
+def _pad_videos(videos, data_format):
+    """Used internally by :func:`Videos.read()` to pad videos of different
+    dimensions to the largest dimensions, and make their mask."""
+    shapes = np.array([video.shape for video in videos]).reshape(-1, 4)
+    max_shape = tuple(np.max(shapes, axis=0))
+    dtype = videos[0].dtype if videos else np.uint8
+    video_tensor = np.zeros((len(videos),) + max_shape, dtype=dtype)
+    mask = np.zeros((len(videos),) + max_shape[:-1], dtype=bool)
+    for idx, video in enumerate(videos):
+        frames, height, width, _ = video.shape
+        video_tensor[idx, :frames, :height, :width] = video
+        mask[idx, :frames, :height, :width] = True
+
+    if data_format == "channels_first":
+        video_tensor = np.transpose(video_tensor, axes=(0, 4, 1, 2, 3))
+
+    return video_tensor, mask
+
+
+def yuv420_to_rgb(videos, data_format="channels_last"):
+    """Converts videos read in the ``"yuv420p"`` pixel format to RGB.
+
+    The conversion uses the BT.601 coefficients (the default of FFmpeg),
+    and the chroma planes are upsampled by repeating each pixel. It is
+    done a few frames at a time, so that the intermediate arrays stay
+    small.
+
+    Parameters
+    ----------
+    videos : :obj:`numpy.ndarray`
+        A video or a tensor of videos (of type ``uint8``), as returned by
+        :func:`Videos.read` with ``pix_fmt="yuv420p"``. For
+        ``"channels_last"``, the last 3 dimensions are
+        ``(3 * <height> / 2, <width>, 1)``.
+    data_format : str
+        Video data format of ``videos``, either "channels_last" or
+        "channels_first".
+
+    Returns
+    -------
+    :obj:`numpy.ndarray`
+        The videos in RGB, with the same data format, of type ``uint8``.
 
-            return (fps, total_frames)
+    Example
+    -------
+    .. code-block:: python
+
+       from mydia import Videos, yuv420_to_rgb
+
+       reader = Videos(target_size=(224, 224), pix_fmt="yuv420p")
+       for batch in reader.iter_read(paths, batch_size=8):
+           rgb = yuv420_to_rgb(batch)
+
+    """
+    videos = np.asarray(videos)
+    if data_format == "channels_first":
+        videos = np.moveaxis(videos, -4, -1)
+    if (videos.shape[-1] != 1) or (videos.shape[-3] % 3):
+        raise ValueError("The videos are not in the 'yuv420p' pixel format")
+    height = videos.shape[-3] * 2 // 3
+    width = videos.shape[-2]
+
+    frames = videos.reshape(-1, height * 3 // 2, width)
+    rgb = np.empty((len(frames), height, width, 3), dtype=np.uint8)
+    for start in range(0, len(frames), YUV_CHUNK):
+        rgb[start : start + YUV_CHUNK] = _yuv420_to_rgb(
+            frames[start : start + YUV_CHUNK], height, width
+        )
 
-        # The method will return nothing if an exception is encountered
+    rgb = rgb.reshape(videos.shape[:-3] + (height, width, 3))
+    if data_format == "channels_first":
+        rgb = np.moveaxis(rgb, -1, -4)
+    return rgb
 
 
-def make_grid(video, num_col=3, padding=5):
+def _yuv420_to_rgb(frames, height, width):
+    """Used internally by :func:`yuv420_to_rgb()` to convert a few frames,
+    of shape ``(<frames>, 3 * <height> / 2, <width>)``."""
+    y = frames[:, :height].astype(np.float32) - 16
+    chroma = frames[:, height:].reshape(-1, 2, height // 2, 1, width // 2, 1)
+    chroma = chroma.astype(np.float32) - 128
+    # Each chroma sample covers a block of 2x2 pixels
+    shape = (len(frames), height // 2, 2, width // 2, 2)
+    u = np.broadcast_to(chroma[:, 0], shape).reshape(-1, height, width)
+    v = np.broadcast_to(chroma[:, 1], shape).reshape(-1, height, width)
+
+    y *= 1.164
+    rgb = np.stack([y + 1.596 * v, y - 0.392 * u - 0.813 * v, y + 2.017 * u], axis=-1)
+    return np.clip(np.rint(rgb), 0, 255).astype(np.uint8)
+
+
+class CompressedVideos(object):
+    """A batch of videos, compressed losslessly in memory.
+
+    Each video is compressed separately (with ``zlib``), so that it can be
+    decompressed on its own. The videos of type ``uint8`` are first
+    replaced by the differences between consecutive frames (modulo 256),
+    which compress much better as most of the pixels change little from
+    one frame to the next. Indexing the batch returns a (decompressed)
+    video.
+
+    This is useful to cache decoded videos in memory, or to store them
+    (the attributes of the batch can be pickled or written to a file).
+
+    Parameters
+    ----------
+    chunks : list[bytes]
+        The compressed data of each video.
+    shapes : list[tuple]
+        The shape of each video.
+    dtype : str
+        The data type of the videos.
+    data_format : str
+        Video data format, either "channels_last" or "channels_first".
+
+    Example
+    -------
+    .. code-block:: python
+
+       from mydia import CompressedVideos, Videos
+
+       reader = Videos(pix_fmt="yuv420p")
+       videos = CompressedVideos.from_videos(reader.read(paths))
+       print(videos.nbytes)
+
+       video = videos[0]
+
+    """
+
+    def __init__(self, chunks, shapes, dtype, data_format="channels_last"):
+        self.chunks = chunks
+        self.shapes = shapes
+        self.dtype = np.dtype(dtype)
+        self.data_format = data_format
+
+    @classmethod
+    def from_videos(cls, videos, data_format="channels_last", level=1):
+        """Compresses a batch of videos.
+
+        Parameters
+        ----------
+        videos : :obj:`numpy.ndarray` or list[:obj:`numpy.ndarray`]
+            A tensor of videos, or a list of 4-dimensional videos (such as
+            a :obj:`RaggedVideos`), of the same data type.
+        data_format : str
+            Video data format of ``videos``, either "channels_last" or
+            "channels_first".
+        level : int
+            The level of compression of ``zlib``, from 1 (fastest) to 9
+            (smallest), defaults to 1.
+
+        Returns
+        -------
+        :obj:`CompressedVideos`
+
+        """
+        axis = 0 if data_format == "channels_last" else 1
+        chunks, shapes = [], []
+        dtype = np.uint8
+        for video in videos:
+            video = np.asarray(video)
+            dtype = video.dtype
+            if (dtype == np.uint8) and (video.size > 0):
+                video = np.diff(video, axis=axis, prepend=np.uint8(0))
+            chunks.append(zlib.compress(np.ascontiguousarray(video), level))
+            shapes.append(video.shape)
+
+        return cls(chunks, shapes, dtype, data_format)
+
+    @property
+    def nbytes(self):
+        """int: The size (in bytes) of the compressed videos."""
+        return sum(len(chunk) for chunk in self.chunks)
+
+    def decompress(self):
+        """Decompresses all the videos.
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            The tensor of videos (they must have the same shape).
+
+        """
+        if len(set(self.shapes)) > 1:
+            raise ValueError(_SHAPE_MISMATCH)
+        return np.stack(list(self))
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def __getitem__(self, idx):
+        if not -len(self) <= idx < len(self):
+            raise IndexError("Index out of range")
+        idx = idx % len(self)
+        video = np.frombuffer(zlib.decompress(self.chunks[idx]), self.dtype)
+        video = video.reshape(self.shapes[idx])
+        if (self.dtype == np.uint8) and (video.size > 0):
+            axis = 0 if self.data_format == "channels_last" else 1
+            video = np.cumsum(video, axis=axis, dtype=np.uint8)
+        return video
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+
+def make_grid(video, num_col=3, padding=5, out=None):
     """Converts a video into a grid of frames.
 
     Parameters
     ----------
     video : :obj:`numpy.ndarray`
-        A 4-dimensional video tensor (a single video).
+        A 4-dimensional video tensor (a single video), or a 5-dimensional
+        tensor of videos (as returned by :func:`Videos.read`) to make one
+        grid per video.
     num_col : int
         The number of columns in the grid, defaults to 3.
     padding : int
         Amount of padding (in pixels), defaults to 5.
+    out : :obj:`numpy.ndarray`
+        An array to write the grid(s) into, defaults to `None`. It must
+        have the same shape as the returned grid(s), and is returned
+        itself. If not set, a new array with the same dtype as ``video``
+        is allocated.
 
     Returns
     -------
     :obj:`numpy.ndarray`
         A gird of frames (numpy array) of shape ``(height, width, 3)``
         if the video is in RGB format, or ``(height, width)`` if the
-        video is in grayscale.
+        video is in grayscale. For a 5-dimensional input, the grids are
+        stacked along a new first axis.
 
     Raises
     ------
     ValueError
-        If the dimension of the ``video`` tensor is invalid.
+        If the dimension of the ``video`` tensor is invalid, or if ``out``
+        does not have the shape of the grid(s).
 
     Example
     -------
@@ -419,41 +2168,259 @@ def make_grid(video, num_col=3, padding=5):
 
     Note
     ----
-    The input to this function should be a single video tensor, with *any*
-    ``data_format``. However, the grid of frames produced as the output will
-    **always** be ``"channels_last"``.
+    The input to this function could have *any* ``data_format``. However,
+    the grid of frames produced as the output will **always** be
+    ``"channels_last"``.
+
+    The grid is allocated once and the frames are copied straight into
+    their cells, so the input is never copied (it may also be a view,
+    such as a ``"channels_first"`` tensor).
 
     """
-    if video.ndim != 4:
+    if video.ndim not in [4, 5]:
         raise ValueError("Invalid value for 'video'")
 
     # If the channels are not at the end, then the format of the video
     # is `channels_first` which needs to be converted to `channels_last`
     if not ((video.shape[-1] == 1) or (video.shape[-1] == 3)):
-        video = np.transpose(video, axes=(1, 2, 3, 0))
+        video = np.moveaxis(video, -4, -1)
 
-    num_frames = video.shape[0]
-    new_height = video.shape[1] + padding
-    new_width = video.shape[2] + padding
-    channels = video.shape[3]
+    batch = video.shape[:-4]
+    num_frames, height, width, channels = video.shape[-4:]
+    new_height = height + padding
+    new_width = width + padding
 
     num_row = int(np.ceil(num_frames / num_col))
-    frame_pad = ((0, 0), (0, padding), (0, padding), (0, 0))
-    grid_pad = ((padding, 0), (padding, 0), (0, 0))
-    extra_frames = (num_row * num_col) - num_frames
-
-    video = np.pad(video, pad_width=frame_pad, mode="constant", constant_values=0)
-    video.resize(
-        (num_frames + extra_frames, new_height, new_width, channels)
-    )  # Appends the extra (empty) frames to the video tensor
-    video = (
-        video.reshape(num_row, num_col, new_height, new_width, channels)
-        .transpose((0, 2, 1, 3, 4))
-        .reshape(num_row * new_height, num_col * new_width, channels)
+    grid_shape = batch + (
+        (num_row * new_height) + padding,
+        (num_col * new_width) + padding,
+        channels,
     )
-    video = np.pad(video, pad_width=grid_pad, mode="constant", constant_values=0)
 
+    if out is None:
+        grid = np.zeros(grid_shape, dtype=video.dtype)
+    else:
+        grid = out[..., np.newaxis] if channels == 1 else out
+        if grid.shape != grid_shape:
+            raise ValueError("Invalid shape of 'out'")
+        grid[...] = 0
+
+    # View of the grid as `(rows, cell height, columns, cell width)`, so
+    # that every frame can be written to its cell with strided slicing
+    cells = grid[..., padding:, padding:, :].reshape(
+        batch + (num_row, new_height, num_col, new_width, channels)
+    )
+    full_rows, remaining = divmod(num_frames, num_col)
+    if full_rows > 0:
+        frames = video[..., : full_rows * num_col, :, :, :].reshape(
+            batch + (full_rows, num_col, height, width, channels)
+        )
+        cells[..., :full_rows, :height, :, :width, :] = np.swapaxes(frames, -4, -3)
+    if remaining > 0:
+        frames = video[..., full_rows * num_col :, :, :, :]
+        cells[..., full_rows, :height, :remaining, :width, :] = np.swapaxes(
+            frames, -4, -3
+        )
+
+    if out is not None:
+        return out
     if channels == 1:
-        video = video[:, :, 0]
+        grid = grid[..., 0]
+
+    return grid
+
+
+def contact_sheet(
+    paths,
+    num_frames,
+    num_col=3,
+    padding=5,
+    target_size=None,
+    to_gray=False,
+    mode="auto",
+    random_state=17,
+    outputs=None,
+    verbose=1,
+    workers=0,
+):
+    """Makes a grid of frames (a contact sheet) for each video, with FFmpeg.
+
+    The frames are selected, resized and tiled into a grid by FFmpeg
+    itself, so only the final grid is passed on to python (or written
+    to disk). The layout of the grid is exactly the same as that of
+    :func:`make_grid`.
+
+    Parameters
+    ----------
+    paths : str or list[str]
+        A list of paths/path of the video(s). Same as for
+        :func:`Videos.read`.
+    num_frames : int
+        The number of frames in each grid. If set to `None`, all the
+        frames of the video are used.
+    num_col : int
+        The number of columns in the grid, defaults to 3.
+    padding : int
+        Amount of padding (in pixels), defaults to 5.
+    target_size : tuple[int, int]
+        A tuple of form ``(width, height)`` indicating the dimension to
+        resize the frames to, defaults to `None`. Same as for
+        :class:`Videos`.
+    to_gray : bool
+        Make the grid in grayscale, defaults to `False`.
+    mode : str
+        The method used for frame selection, defaults to "auto". Same as
+        for :class:`Videos`.
+    random_state : int
+        Integer that seeds the (numpy) random number generator, defaults
+        to 17. Used only when ``mode`` is set to "random".
+    outputs : list[str]
+        Paths of the image files to write the grids to (one for each
+        video), defaults to `None`. The format of the image is inferred
+        from the extension of its path.
+    verbose : int
+        If set to 0, the progress bar will be disabled.
+    workers : int
+        The number of processes (CPUs) to use, same as for
+        :func:`Videos.read`. Defaults to 0.
+
+    Returns
+    -------
+    :obj:`numpy.ndarray`
+        The grids of shape ``(<videos>, <height>, <width>, 3)`` if the
+        frames are in RGB format, or ``(<videos>, <height>, <width>)`` if
+        they are in grayscale. `None` is returned if ``outputs`` is set.
+
+    Example
+    -------
+    .. code-block:: python
+
+       from mydia import contact_sheet
+
+       grids = contact_sheet(
+           ["./path/to/video_1", "./path/to/video_2"],
+           num_frames=12,
+           num_col=4,
+           target_size=(320, 180),
+       )
+
+    Important
+    ---------
+    Unless ``outputs`` is set, each video should have the same dimension
+    after resizing, otherwise the grids cannot be stacked into a single
+    tensor.
+
+    """
+    paths = _check_sources(paths)
+    if outputs is None:
+        outputs = [None] * len(paths)
+    elif len(outputs) != len(paths):
+        raise ValueError("Invalid value of 'outputs'")
+    disable = False
+    if verbose == 0:
+        disable = True
+
+    reader = Videos(
+        target_size=target_size,
+        to_gray=to_gray,
+        num_frames=num_frames,
+        mode=mode,
+        random_state=random_state,
+    )
+    tasks = [
+        (task, num_col, padding, output)
+        for task, output in zip(_plan_tasks(reader.spec, paths), outputs)
+    ]
+    spec = reader.spec
+    list_of_grids = [None] * len(tasks)
+    with _worker_pool(spec, workers, paths) as pool:
+        results = _map_tasks(pool, _decode_grid, spec, tasks, disable, ordered=False)
+        for idx, grid in results:
+            list_of_grids[idx] = grid
+
+    if outputs[0] is not None:
+        return None
+
+    grids = np.vstack(list_of_grids)
+    if grids.shape[-1] == 1:
+        grids = grids[..., 0]
+
+    return grids
 
-    return video
+
+def read_multi(readers, paths, verbose=1, workers=0):
+    """Reads the same videos with several readers, decoding them only once.
+
+    Each video is probed and decoded once, and the decoded frames are
+    split (by FFmpeg) into one branch per reader. Every reader selects,
+    resizes and converts the frames of its own branch, so the readers may
+    have a different ``target_size``, ``to_gray``, ``num_frames``,
+    ``mode``, ``normalize`` or ``data_format``.
+
+    Parameters
+    ----------
+    readers : list[:obj:`Videos`]
+        The readers. As the frames are decoded only once, they must have
+        the same ``skip_frame`` and ``lowres``, and use the ``"ffmpeg"``
+        backend.
+    paths : str or list[str]
+        A list of paths/path of the video(s) to be read. Same as for
+        :func:`Videos.read`.
+    verbose : int
+        If set to 0, the progress bar will be disabled.
+    workers : int
+        The number of processes (CPUs) to use, same as for
+        :func:`Videos.read`. Defaults to 0.
+
+    Returns
+    -------
+    list
+        The videos read by each reader, in the order of ``readers``. Each
+        is the same as the output of :func:`Videos.read` for that reader.
+
+    Raises
+    ------
+    ValueError
+        If the readers do not decode the frames in the same way.
+
+    Example
+    -------
+    .. code-block:: python
+
+       from mydia import Videos, read_multi
+
+       spatial = Videos(target_size=(224, 224), num_frames=16)
+       temporal = Videos(target_size=(112, 112), to_gray=True, num_frames=64)
+       spatial_videos, temporal_videos = read_multi([spatial, temporal], paths)
+
+    """
+    paths = _check_sources(paths)
+    if not readers:
+        raise ValueError("Invalid value of 'readers'")
+    specs = tuple(reader.spec for reader in readers)
+    if len({(spec.skip_frame, spec.lowres) for spec in specs}) > 1:
+        raise ValueError(
+            "The readers must have the same 'skip_frame' and 'lowres', as "
+            "the frames are decoded only once"
+        )
+    if any(spec.backend.name != "ffmpeg" for spec in specs):
+        raise ValueError("The readers must use the 'ffmpeg' backend")
+    disable = False
+    if verbose == 0:
+        disable = True
+
+    with _worker_pool(specs, workers, paths) as pool:
+        infos = _probe_paths(pool, specs, paths, _probe_multi)
+        infos = [info if info is not None else [None] * len(specs) for info in infos]
+        tasks = [
+            _plan_tasks(spec, paths, [info[idx] for info in infos])
+            for idx, spec in enumerate(specs)
+        ]
+        tasks = list(zip(paths, zip(*tasks)))
+        results = _map_tasks(pool, _decode_multi, specs, tasks, disable, ordered=False)
+        videos = [[None] * len(paths) for _ in readers]
+        for position, result in results:
+            for idx, video in enumerate(result):
+                videos[idx][position] = video[0]
+
+    return [reader._collate(batch) for reader, batch in zip(readers, videos)]
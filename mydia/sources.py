@@ -0,0 +1,546 @@
+"""Contains the helpers to read videos that are not files on the disk.
+
+Apart from paths, a video can be given as ``bytes`` (or any other buffer),
+as a file-like object, or as a member of a tar/zip archive (see
+:func:`archive_members`). Such videos are passed on to FFmpeg through its
+standard input, so they are never written to the disk.
+
+"""
+
+from contextlib import contextmanager
+import json
+import os
+import subprocess
+import tarfile
+import tempfile
+import threading
+from typing import NamedTuple
+import zipfile
+
+VIDEO_EXTENSIONS = (".avi", ".m4v", ".mkv", ".mov", ".mp4", ".mpeg", ".mpg", ".webm")
+# The maximum size (in bytes) of each read of the outputs of FFmpeg
+CHUNK_SIZE = 2**20
+
+
+class ArchiveMember(NamedTuple):
+    """A named tuple representing a video inside a tar/zip archive.
+
+    It only refers to the video, which is read from the archive (by the
+    worker process, if any) when the video itself is read. The videos
+    inside a compressed tar archive are the exception: they are all read
+    (in a single pass over the archive) before the videos are decoded, and
+    kept in memory until then.
+
+    """
+
+    archive: str
+    name: str
+    offset: int = None
+    size: int = None
+
+
+class _LoadedMember(NamedTuple):
+    """A named tuple representing a video inside a compressed tar archive,
+    along with its data (see :func:`_load_members()`)."""
+
+    member: ArchiveMember
+    data: bytes
+
+    def __repr__(self):
+        return f"_LoadedMember({self.member!r})"
+
+
+class FFmpegError(Exception):
+    """Raised when ``ffmpeg`` (or ``ffprobe``) fails to read a video.
+
+    The errors of PyAV are also raised as this exception, by the ``"pyav"``
+    backend.
+
+    Attributes
+    ----------
+    cmd : str
+        The command that failed, "ffmpeg" or "ffprobe" (or "pyav").
+    filename : str
+        The path of the video (or the name of the archive and the member).
+        For a video given as ``bytes``, the filename given to the command
+        (``"pipe:"`` if it was written to its standard input, or
+        ``"<bytes>"`` for PyAV).
+    returncode : int
+        The exit code of the command (or the error code, for PyAV).
+    stderr : bytes
+        The errors logged by the command (or the message of the error, for
+        PyAV).
+
+    """
+
+    def __init__(self, cmd, filename, returncode, stderr):
+        self.cmd = cmd
+        self.filename = filename
+        self.returncode = returncode
+        self.stderr = stderr or b""
+        message = self.stderr.decode("utf-8", "replace").strip()
+        super().__init__(
+            f"'{cmd}' failed to read '{filename}' (exit code {returncode})"
+            + (f": {message}" if message else "")
+        )
+
+    def __reduce__(self):
+        # So that the error can be sent back from the worker processes
+        return type(self), (self.cmd, self.filename, self.returncode, self.stderr)
+
+
+class _OpenedSource(NamedTuple):
+    """A named tuple representing a video that is ready to be passed on to
+    FFmpeg: the filename to use, the data to write to its standard input,
+    the file descriptors it should inherit and the name of the video (see
+    :func:`_source_name()`)."""
+
+    filename: str
+    data: bytes = None
+    pass_fds: tuple = ()
+    name: str = None
+
+
+def archive_members(path, extensions=VIDEO_EXTENSIONS):
+    """Lists the videos inside a tar or zip archive.
+
+    Parameters
+    ----------
+    path : str
+        The path of the archive. Tar archives may be compressed.
+    extensions : tuple[str]
+        Only the members with one of these extensions are listed, defaults
+        to common video extensions. If set to `None`, all the members are
+        listed.
+
+    Returns
+    -------
+    list[:obj:`ArchiveMember`]
+        The videos, in the order they are stored in the archive. They can
+        be passed to :func:`Videos.read` as if they were paths.
+
+    Example
+    -------
+    .. code-block:: python
+
+       from mydia import Videos, archive_members
+
+       reader = Videos(target_size=(224, 224), num_frames=16)
+       video = reader.read(archive_members("./shard-000000.tar"))
+
+    """
+
+    def is_video(name):
+        return (extensions is None) or name.lower().endswith(tuple(extensions))
+
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            return [
+                ArchiveMember(path, info.filename)
+                for info in archive.infolist()
+                if (not info.is_dir()) and is_video(info.filename)
+            ]
+
+    try:
+        # The members of an uncompressed tar archive can be read directly,
+        # by seeking to their offset
+        archive = tarfile.open(path, mode="r:")
+        seekable = True
+    except tarfile.ReadError:
+        archive = tarfile.open(path, mode="r:*")
+        seekable = False
+    with archive:
+        return [
+            ArchiveMember(
+                path,
+                info.name,
+                info.offset_data if seekable else None,
+                info.size if seekable else None,
+            )
+            for info in archive.getmembers()
+            if info.isfile() and is_video(info.name)
+        ]
+
+
+def _check_sources(paths):
+    """Used internally to convert the ``paths`` given to a reader into a
+    list of sources, that can be sent to the worker processes.
+
+    File-like objects, and the videos inside compressed tar archives, are
+    read at this point.
+
+    """
+    if not isinstance(paths, list):
+        if isinstance(paths, (str, bytes, bytearray, memoryview, ArchiveMember)):
+            paths = [paths]
+        elif hasattr(paths, "read"):
+            paths = [paths]
+        else:
+            raise ValueError("Invalid value of 'paths'")
+    if not paths:
+        raise ValueError("Invalid value of 'paths'")
+
+    sources = []
+    for source in paths:
+        if isinstance(source, (str, bytes, ArchiveMember)):
+            sources.append(source)
+        elif isinstance(source, (bytearray, memoryview)):
+            sources.append(bytes(source))
+        elif hasattr(source, "read"):
+            sources.append(source.read())
+        else:
+            raise ValueError("Invalid value of 'paths'")
+
+    return _load_members(sources)
+
+
+def _load_members(sources):
+    """Used internally to read the videos inside compressed tar archives,
+    in a single pass over each archive.
+
+    A member of a compressed archive cannot be found without decompressing
+    all the members before it, so reading the members one at a time would
+    take time quadratic in their number.
+
+    """
+    wanted = {}
+    for source in sources:
+        if isinstance(source, ArchiveMember) and (source.offset is None):
+            if not zipfile.is_zipfile(source.archive):
+                wanted.setdefault(source.archive, set()).add(source.name)
+
+    data = {}
+    for archive_path, names in wanted.items():
+        with tarfile.open(archive_path, mode="r|*") as archive:
+            for info in archive:
+                if info.name in names:
+                    data[archive_path, info.name] = archive.extractfile(info).read()
+
+    return [
+        (
+            _LoadedMember(source, data[source.archive, source.name])
+            if isinstance(source, ArchiveMember)
+            and (source.archive, source.name) in data
+            else source
+        )
+        for source in sources
+    ]
+
+
+def _source_name(source):
+    """Used internally to get a name for a source, or `None` for the videos
+    given as ``bytes``."""
+    if isinstance(source, str):
+        return source
+    if isinstance(source, _LoadedMember):
+        source = source.member
+    if isinstance(source, ArchiveMember):
+        return f"{source.archive}/{source.name}"
+    if isinstance(source, _OpenedSource):
+        return source.name
+    return None
+
+
+def _load_source(source):
+    """Used internally to read the data of a video that is not a file."""
+    if isinstance(source, _LoadedMember):
+        return source.data
+    if not isinstance(source, ArchiveMember):
+        return source
+    if source.offset is not None:
+        with open(source.archive, "rb") as f:
+            f.seek(source.offset)
+            return f.read(source.size)
+    if zipfile.is_zipfile(source.archive):
+        with zipfile.ZipFile(source.archive) as archive:
+            return archive.read(source.name)
+    with tarfile.open(source.archive, mode="r:*") as archive:
+        return archive.extractfile(source.name).read()
+
+
+@contextmanager
+def _open_source(source):
+    """Used internally to make a video available to FFmpeg.
+
+    Files are passed on by their path, and everything else through the
+    standard input of FFmpeg. However, some formats (for example MP4
+    files whose meta-data is at the end) need to be seekable. On Linux,
+    these are written to an anonymous in-memory file. Otherwise, a
+    temporary file is used.
+
+    Yields
+    ------
+    :obj:`_OpenedSource`
+
+    """
+    if isinstance(source, _OpenedSource):
+        yield source
+        return
+    if isinstance(source, str):
+        yield _OpenedSource(source, name=source)
+        return
+
+    name = _source_name(source)
+    data = _load_source(source)
+    if not _needs_seeking(data):
+        yield _OpenedSource("pipe:", data, name=name)
+        return
+
+    if hasattr(os, "memfd_create"):
+        fd = os.memfd_create("mydia")
+        try:
+            with open(fd, "wb", closefd=False) as f:
+                f.write(data)
+            yield _OpenedSource(f"/proc/self/fd/{fd}", pass_fds=(fd,), name=name)
+        finally:
+            os.close(fd)
+    else:
+        f = tempfile.NamedTemporaryFile(prefix="mydia-", delete=False)
+        try:
+            with f:
+                f.write(data)
+            yield _OpenedSource(f.name, name=name)
+        finally:
+            os.remove(f.name)
+
+
+def _needs_seeking(data):
+    """Used internally to check if a video in the ISO base media file format
+    (MP4, MOV, ...) has its meta-data (``moov`` box) after its media data
+    (``mdat`` box), in which case it cannot be read from a pipe."""
+    offset = 0
+    while offset + 8 <= len(data):
+        size = int.from_bytes(data[offset : offset + 4], "big")
+        box = data[offset + 4 : offset + 8]
+        if box == b"moov":
+            return False
+        if box == b"mdat":
+            return True
+        if size == 1 and offset + 16 <= len(data):
+            size = int.from_bytes(data[offset + 8 : offset + 16], "big")
+        if size < 8:
+            # Not a valid box, so not an MP4 file
+            return False
+        offset += size
+    return False
+
+
+def _probe(opened, timeout=None, **kwargs):
+    """Used internally to run ``ffprobe`` on an opened source.
+
+    Same as :func:`ffmpeg.probe`, but the source may be given through the
+    standard input, and ``ffprobe`` is killed if it does not finish within
+    ``timeout`` seconds.
+
+    """
+    import ffmpeg
+
+    args = ["ffprobe", "-loglevel", "error", "-show_format", "-show_streams"]
+    args += ["-of", "json"]
+    args += ffmpeg._utils.convert_kwargs_to_cmd_line_args(kwargs)
+    args += [opened.filename]
+    out, _ = _communicate(args, opened, timeout=timeout)
+    return json.loads(out.decode("utf-8"))
+
+
+def _run(stream, opened, **kwargs):
+    """Used internally to run FFmpeg for the given (output) stream, on an
+    opened source.
+
+    Same as :func:`ffmpeg.run`, with ``capture_stdout=True`` and
+    ``capture_stderr=True``.
+
+    """
+    return _communicate(stream.compile(), opened, **kwargs)[0]
+
+
+def _run_outputs(make_stream, opened, num_outputs, timeout=None, max_bytes=None):
+    """Used internally to run FFmpeg with several outputs, on an opened
+    source.
+
+    The first output is written to the standard output of FFmpeg, and each
+    of the others to a pipe of its own. The pipes are read by threads while
+    FFmpeg runs, so that it never blocks on a full pipe.
+
+    Parameters
+    ----------
+    make_stream : callable
+        Takes the filenames of the outputs (such as ``"pipe:5"``) and
+        returns the (merged) output stream.
+    opened : :obj:`_OpenedSource`
+        The video to be read.
+    num_outputs : int
+        The number of outputs.
+    timeout : float
+        See :func:`_communicate()`.
+    max_bytes : list[int]
+        The maximum size (in bytes) of each output, defaults to `None` (no
+        limit). See :func:`_communicate()`.
+
+    Returns
+    -------
+    list[bytes]
+        The data written to each output.
+
+    """
+    pipes = [os.pipe() for _ in range(num_outputs - 1)]
+    outputs = [None] * num_outputs
+    if max_bytes is None:
+        max_bytes = [None] * num_outputs
+
+    def read_pipe(idx, fd):
+        with open(fd, "rb") as f:
+            outputs[idx] = _read_output(f, max_bytes[idx])
+            if len(outputs[idx]) > _limit(max_bytes[idx]):
+                # The rest of the output is discarded, so that FFmpeg does
+                # not block on a full pipe
+                while f.read(CHUNK_SIZE):
+                    pass
+
+    threads = [
+        threading.Thread(target=read_pipe, args=(idx, read), daemon=True)
+        for idx, (read, _) in enumerate(pipes, start=1)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        filenames = ["pipe:"] + [f"pipe:{write}" for _, write in pipes]
+        args = make_stream(filenames).compile()
+        pass_fds = tuple(write for _, write in pipes)
+        outputs[0], _ = _communicate(
+            args, opened, pass_fds=pass_fds, timeout=timeout, max_bytes=max_bytes[0]
+        )
+    finally:
+        # The threads only reach the end of their pipes once no process
+        # has them open for writing
+        for _, write in pipes:
+            os.close(write)
+        for thread in threads:
+            thread.join()
+    for output, limit in zip(outputs, max_bytes):
+        if len(output) > _limit(limit):
+            raise _output_error(args[0], limit)
+    return outputs
+
+
+def _communicate(args, opened, pass_fds=(), timeout=None, max_bytes=None):
+    """Used internally to run a command, with the data of an opened source
+    written to its standard input.
+
+    The command is killed (so that it never keeps running in the
+    background) if it does not finish within ``timeout`` seconds, in
+    which case a :obj:`TimeoutError` is raised, or if it writes more than
+    ``max_bytes`` bytes to its standard output, in which case a
+    :obj:`MemoryError` is raised. If it fails, an :obj:`FFmpegError` with
+    the errors that it logged is raised.
+
+    Returns
+    -------
+    tuple[bytes, bytes]
+        The standard output and the standard error of the command.
+
+    """
+    process = subprocess.Popen(
+        args,
+        stdin=subprocess.PIPE if opened.data is not None else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        pass_fds=tuple(opened.pass_fds) + tuple(pass_fds),
+    )
+    expired = threading.Event()
+
+    def expire():
+        expired.set()
+        process.kill()
+
+    # The standard input and error are handled by threads, while the
+    # standard output is read by this one
+    err = []
+    threads = [
+        threading.Thread(target=lambda: err.append(process.stderr.read()), daemon=True)
+    ]
+    if opened.data is not None:
+        threads.append(
+            threading.Thread(
+                target=_write_input, args=(process.stdin, opened.data), daemon=True
+            )
+        )
+    timer = None
+    if timeout is not None:
+        timer = threading.Timer(timeout, expire)
+        timer.daemon = True
+        timer.start()
+    try:
+        for thread in threads:
+            thread.start()
+        out = _read_output(process.stdout, max_bytes)
+        if len(out) <= _limit(max_bytes):
+            process.wait()
+    finally:
+        if timer is not None:
+            timer.cancel()
+        # The process is still running if its output is too large, or if
+        # reading it was interrupted
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        for thread in threads:
+            thread.join()
+        process.stdout.close()
+        process.stderr.close()
+
+    if expired.is_set():
+        raise TimeoutError(f"'{args[0]}' did not finish in {timeout} seconds")
+    if len(out) > _limit(max_bytes):
+        raise _output_error(args[0], max_bytes)
+    if process.returncode != 0:
+        filename = opened.name or opened.filename
+        raise FFmpegError(args[0], filename, process.returncode, err[0])
+    return out, err[0]
+
+
+def _write_input(f, data):
+    """Used internally to write the data of a video to the standard input of
+    a command. The command may exit before reading all of it."""
+    try:
+        f.write(data)
+    except OSError:
+        pass
+    finally:
+        try:
+            f.close()
+        except OSError:
+            pass
+
+
+def _read_output(f, max_bytes):
+    """Used internally to read the output of a command, up to (a little)
+    past ``max_bytes``, so that a larger output can be detected.
+
+    The output is read in chunks as it is written, since reading all of
+    it at once would allocate ``max_bytes`` upfront.
+
+    """
+    if max_bytes is None:
+        return f.read()
+    out = bytearray()
+    while len(out) <= max_bytes:
+        chunk = f.read1(CHUNK_SIZE)
+        if not chunk:
+            break
+        out += chunk
+    return out
+
+
+def _limit(max_bytes):
+    """Used internally to compare the size of an output to its limit."""
+    return float("inf") if max_bytes is None else max_bytes
+
+
+def _output_error(cmd, max_bytes):
+    """Used internally to make the error raised for an output that is larger
+    than expected."""
+    return MemoryError(
+        f"The output of '{cmd}' is larger than the expected {max_bytes} bytes, "
+        "the video (or its meta-data) may be corrupt"
+    )
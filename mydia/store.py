@@ -0,0 +1,433 @@
+"""Contains the writer and the reader of a sharded tensor store.
+
+A store is a directory of **shards** (raw ``.npy`` files that can be
+memory-mapped) and **manifests** (``.json`` files). Each video is written
+to a shard as a contiguous block of bytes, and its manifest records the
+shard, offset, shape and dtype of the video, along with its meta-data and
+the settings of the reader used to read it.
+
+Every writer has a ``name``, and writes only its own shards and manifest.
+Therefore, multiple writers (for example, one per process or machine) can
+write to the same store in parallel, and a store can be appended to by
+opening a writer with a new (or the same) name.
+
+"""
+
+from datetime import datetime
+import json
+import os
+import uuid
+
+import numpy as np
+
+from .mydia import (
+    MODES,
+    _decode_task,
+    _map_tasks,
+    _plan_tasks,
+    _probe_paths,
+    _video_key,
+    _worker_pool,
+)
+from .sources import _check_sources, _source_name
+
+MANIFEST_VERSION = 1
+# Offsets of the videos in a shard are aligned to this many bytes, so that
+# the videos can be viewed with any dtype
+ALIGNMENT = 64
+
+
+class StoreWriter(object):
+    """Writes videos to a store.
+
+    Parameters
+    ----------
+    root : str
+        The directory of the store. It is created if it does not exist.
+    shard_size : int
+        The maximum size (in bytes) of a shard, defaults to 1 GiB. A video
+        is never split across shards, so a video larger than this is
+        written to a shard of its own.
+    name : str
+        The name of the writer, defaults to `None`, in which case a unique
+        name is generated. If a writer with the same name has already
+        written to the store, the new videos are appended to its videos.
+    settings : dict
+        The settings of the reader used to read the videos, defaults to
+        `None`. They are recorded in the manifest.
+
+    Example
+    -------
+    .. code-block:: python
+
+       from mydia import Videos
+       from mydia.store import StoreWriter
+
+       reader = Videos(target_size=(224, 224), num_frames=16)
+       with StoreWriter("./store", name="rank-0") as writer:
+           for batch in reader.iter_read(paths, batch_size=64):
+               for video in batch:
+                   writer.add(video)
+
+    Note
+    ----
+    The videos are buffered in memory until a shard is full. The manifest
+    is updated only after a shard has been written, so that it always
+    describes complete shards. Call :func:`close()` (or use the writer as
+    a context manager) to write the last shard.
+
+    """
+
+    def __init__(self, root, shard_size=2**30, name=None, settings=None):
+        self.root = root
+        self.shard_size = shard_size
+        self.name = name if name is not None else uuid.uuid4().hex[:12]
+        os.makedirs(root, exist_ok=True)
+
+        self.entries = []
+        self.settings = settings
+        self._num_shards = 0
+        manifest_path = self._manifest_path()
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            self.entries = manifest["videos"]
+            self._num_shards = manifest["num_shards"]
+            if settings is None:
+                self.settings = manifest["settings"]
+
+        self._pending = []
+        self._pending_bytes = 0
+
+    def add(self, video, info=None, key=None, index=None):
+        """Adds a video to the store.
+
+        Parameters
+        ----------
+        video : :obj:`numpy.ndarray`
+            The video to be written.
+        info : :obj:`mydia.VideoInfo`
+            The meta-data of the video, defaults to `None`.
+        key : str
+            An identifier of the video (for example its path), defaults to
+            `None`.
+        index : int
+            The position of the video in the list of videos being written
+            (see :func:`export()`), defaults to `None`.
+
+        """
+        video = np.ascontiguousarray(video)
+        nbytes = _aligned(video.nbytes)
+        if self._pending and (self._pending_bytes + nbytes > self.shard_size):
+            self.flush()
+
+        entry = {
+            "key": key,
+            "index": index,
+            "shape": list(video.shape),
+            "dtype": video.dtype.str,
+            "info": _info_to_dict(info),
+        }
+        self._pending.append((entry, video))
+        self._pending_bytes += nbytes
+
+    def flush(self):
+        """Writes the buffered videos to a new shard, and updates the
+        manifest."""
+        if not self._pending:
+            return
+
+        shard = f"shard-{self.name}-{self._num_shards:05d}.npy"
+        shard_path = os.path.join(self.root, shard)
+        temp_path = shard_path + ".tmp"
+        data = np.lib.format.open_memmap(
+            temp_path, mode="w+", dtype=np.uint8, shape=(self._pending_bytes,)
+        )
+        offset = 0
+        for entry, video in self._pending:
+            data[offset : offset + video.nbytes] = video.reshape(-1).view(np.uint8)
+            entry.update(shard=shard, offset=offset, nbytes=video.nbytes)
+            self.entries.append(entry)
+            offset += _aligned(video.nbytes)
+        data.flush()
+        del data
+        os.replace(temp_path, shard_path)
+
+        self._num_shards += 1
+        self._pending = []
+        self._pending_bytes = 0
+        self._write_manifest()
+
+    def close(self):
+        """Writes the remaining videos, see :func:`flush()`."""
+        self.flush()
+        if not os.path.exists(self._manifest_path()):
+            self._write_manifest()
+
+    def _manifest_path(self):
+        return os.path.join(self.root, f"manifest-{self.name}.json")
+
+    def _write_manifest(self):
+        """Used internally to (atomically) write the manifest of the writer."""
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "name": self.name,
+            "updated": datetime.now().isoformat(),
+            "settings": self.settings,
+            "num_shards": self._num_shards,
+            "videos": self.entries,
+        }
+        manifest_path = self._manifest_path()
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class StoreReader(object):
+    """Reads videos from a store.
+
+    The shards are memory-mapped, so the videos are read from the disk
+    only when they are accessed. Indexing the store returns a read-only
+    view of a video, in the format it was written (``"channels_last"``
+    for the videos written by :func:`export()`).
+
+    Parameters
+    ----------
+    root : str
+        The directory of the store.
+
+    Example
+    -------
+    .. code-block:: python
+
+       from mydia.store import StoreReader
+
+       store = StoreReader("./store")
+       video = store[42]
+
+    Note
+    ----
+    The videos of all the writers are indexed together, ordered by the
+    name of the writer, and then in the order they were written. The videos
+    written by :func:`export()` are ordered by their position in ``paths``
+    instead, since they are written in the order they are read.
+
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.entries = []
+        self.settings = {}
+        manifests = sorted(
+            name
+            for name in os.listdir(root)
+            if name.startswith("manifest-") and name.endswith(".json")
+        )
+        for name in manifests:
+            with open(os.path.join(root, name)) as f:
+                manifest = json.load(f)
+            self.entries.extend(_ordered(manifest["videos"]))
+            self.settings[manifest["name"]] = manifest["settings"]
+        self._shards = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, idx):
+        entry = self.entries[idx]
+        data = self._shards.get(entry["shard"])
+        if data is None:
+            data = np.load(os.path.join(self.root, entry["shard"]), mmap_mode="r")
+            self._shards[entry["shard"]] = data
+        video = data[entry["offset"] : entry["offset"] + entry["nbytes"]]
+        return video.view(np.dtype(entry["dtype"])).reshape(entry["shape"])
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    @property
+    def keys(self):
+        """list[str]: The keys of the videos."""
+        return [entry["key"] for entry in self.entries]
+
+    @property
+    def infos(self):
+        """list[dict]: The meta-data of the videos."""
+        return [entry["info"] for entry in self.entries]
+
+
+def export(
+    reader,
+    paths,
+    root,
+    shard_size=2**30,
+    name=None,
+    verbose=1,
+    workers=0,
+    resume=False,
+):
+    """Reads videos and writes them to a store.
+
+    The videos are written to the store as soon as they are read (in the
+    order in which they are read, if ``workers`` is set), so they are never
+    all kept in memory. The position of each video in ``paths`` is recorded
+    in the manifest, and :class:`StoreReader` orders the videos by it.
+
+    The manifest of the writer doubles as a checkpoint: it records the
+    position (in ``paths``) of every video that is in a complete shard,
+    and is updated after each shard is written. If the export is stopped
+    (for example, if the process is killed), it can be resumed from the
+    last complete shard with ``resume=True``.
+
+    Parameters
+    ----------
+    reader : :obj:`mydia.Videos`
+        The reader used to read the videos. Its settings are recorded in
+        the manifest.
+    paths : str or list[str]
+        A list of paths/path of the video(s) to be read. Same as for
+        :func:`mydia.Videos.read`. The path of each video (or the name of
+        the archive and the member) is used as its key.
+    root : str
+        The directory of the store.
+    shard_size : int
+        The maximum size (in bytes) of a shard, defaults to 1 GiB.
+    name : str
+        The name of the writer, defaults to `None`. See
+        :class:`StoreWriter`.
+    verbose : int
+        If set to 0, the progress bar will be disabled.
+    workers : int
+        The number of processes (CPUs) to use for reading the videos.
+        Same as for :func:`mydia.Videos.read`.
+    resume : bool
+        Resume an export to the same store, by the writer with the same
+        ``name`` and with the same ``paths`` and reader, defaults to
+        `False`. The videos that are already in the store are skipped.
+        Only the videos of the last (incomplete) shard are read again,
+        so a smaller ``shard_size`` makes resuming cheaper.
+
+    Returns
+    -------
+    :obj:`StoreWriter`
+        The (closed) writer, with the entries of all its videos.
+
+    Raises
+    ------
+    ValueError
+        If ``resume`` is set without a ``name``, or if the store was
+        written with other videos or another reader.
+
+    Example
+    -------
+    .. code-block:: python
+
+       from mydia import Videos
+       from mydia.store import StoreReader, export
+
+       reader = Videos(target_size=(112, 112), num_frames=16)
+       export(reader, paths, "./store", workers=4)
+
+       store = StoreReader("./store")
+
+    """
+    paths = _check_sources(paths)
+    if resume and (name is None):
+        raise ValueError("Set 'name' to resume an export")
+    disable = False
+    if verbose == 0:
+        disable = True
+
+    spec = reader.spec
+    settings = _settings(reader)
+    # The settings of the writer are the ones in its manifest, if any
+    writer = StoreWriter(root, shard_size, name, None if resume else settings)
+    completed = set()
+    if resume:
+        completed = _completed(writer, paths, settings)
+        writer.settings = settings
+    todo = [idx for idx in range(len(paths)) if idx not in completed]
+    sources = [paths[idx] for idx in todo]
+    keys = [_video_key(paths[idx], idx) for idx in todo]
+    # The videos appended to those of a previous export come after them
+    offset = 0 if resume else len(writer.entries)
+
+    with _worker_pool(spec, workers, paths) as pool:
+        with writer:
+            infos = _probe_paths(pool, spec, sources)
+            tasks = _plan_tasks(spec, sources, infos, keys)
+            results = _map_tasks(
+                pool, _decode_task, spec, tasks, disable, ordered=False
+            )
+            for position, (video, info) in results:
+                task = tasks[position]
+                writer.add(
+                    video[0],
+                    info=info,
+                    key=_source_name(task.source),
+                    index=offset + todo[position],
+                )
+
+    return writer
+
+
+def _completed(writer, paths, settings):
+    """Used internally by :func:`export()` to get the positions of the
+    videos that are already in the store, when resuming an export."""
+    if writer.entries and (json.loads(json.dumps(settings)) != writer.settings):
+        raise ValueError("The store was written with a different reader")
+    completed = set()
+    for entry in writer.entries:
+        idx = entry.get("index")
+        if idx is None:
+            continue
+        if (idx >= len(paths)) or (entry["key"] != _source_name(paths[idx])):
+            raise ValueError("The store was written with different videos")
+        completed.add(idx)
+    return completed
+
+
+def _ordered(entries):
+    """Used internally to order the entries of a writer by their position
+    in the videos that were exported, if they all have one."""
+    if all(entry.get("index") is not None for entry in entries):
+        return sorted(entries, key=lambda entry: entry["index"])
+    return entries
+
+
+def _aligned(nbytes):
+    """Used internally to round ``nbytes`` up to the alignment of offsets."""
+    return -(-nbytes // ALIGNMENT) * ALIGNMENT
+
+
+def _info_to_dict(info):
+    """Used internally to convert the meta-data of a video to JSON."""
+    if info is None:
+        return None
+    info = info._asdict()
+    if info.get("target_size") is not None:
+        info["target_size"] = info["target_size"]._asdict()
+    return info
+
+
+def _settings(reader):
+    """Used internally to convert the settings of a reader to JSON."""
+    spec = reader.spec
+    mode = next(
+        (name for name, func in MODES.items() if func is spec.mode),
+        getattr(spec.mode, "__name__", repr(spec.mode)),
+    )
+    settings = spec._asdict()
+    settings["mode"] = mode
+    settings["backend"] = spec.backend.name
+    if spec.target_size is not None:
+        settings["target_size"] = spec.target_size._asdict()
+    settings["data_format"] = "channels_last"
+    return settings
@@ -3,43 +3,191 @@
 Refer to the documentation of the class :class:`Videos` for further
 details on their usage.
 
+Each mode also has a batched version, that computes the indices of the
+frames for many videos at once, given arrays of their total number of
+frames, frame rates and seeds.
+
 """
 
-from typing import List
+import zlib
 
 import numpy as np
 
 
-def _mode_auto(total_frames: int, num_frames: int, fps: int, *args) -> List[int]:
+def _mode_auto(total_frames: int, num_frames: int, fps: int, *args) -> np.ndarray:
     """The ``auto`` mode for frame extraction"""
-    return np.linspace(
-        0, total_frames, num_frames, endpoint=False, dtype=np.int
-    ).tolist()
+    return np.linspace(0, total_frames, num_frames, endpoint=False, dtype=np.int64)
 
 
 def _mode_random(
     total_frames: int, num_frames: int, fps: int, random_state: int
-) -> List[int]:
+) -> np.ndarray:
     """The ``random`` mode for frame extraction"""
-    r = np.random.RandomState(random_state)
-    return np.sort(r.choice(total_frames, size=num_frames, replace=False)).tolist()
+    if random_state is None:
+        random_state = np.random.SeedSequence().generate_state(1)[0]
+    total_frames = np.array([total_frames], dtype=np.int64)
+    seeds = np.array([random_state], dtype=np.int64)
+    return _batch_random(total_frames, num_frames, None, seeds)[0]
 
 
-def _mode_first(total_frames: int, num_frames: int, fps: int, *args) -> List[int]:
+def _mode_first(total_frames: int, num_frames: int, fps: int, *args) -> np.ndarray:
     """The ``first`` mode for frame extraction"""
-    indices = np.arange(total_frames)
-    return indices[:num_frames].tolist()
+    return np.arange(num_frames, dtype=np.int64)
 
 
-def _mode_last(total_frames: int, num_frames: int, fps: int, *args) -> List[int]:
+def _mode_last(total_frames: int, num_frames: int, fps: int, *args) -> np.ndarray:
     """The ``last`` mode for frame extraction"""
-    indices = np.arange(total_frames)
-    return indices[(total_frames - num_frames) :].tolist()
+    return np.arange(total_frames - num_frames, total_frames, dtype=np.int64)
 
 
-def _mode_middle(total_frames: int, num_frames: int, fps: int, *args) -> List[int]:
+def _mode_middle(total_frames: int, num_frames: int, fps: int, *args) -> np.ndarray:
     """The ``middle`` mode for frame extraction"""
-    indices = np.arange(total_frames)
     # No. of frames to remove from the front
-    front = ((total_frames - num_frames) // 2) + 1
-    return indices[front : (front + num_frames)].tolist()
+    front = min(((total_frames - num_frames) // 2) + 1, total_frames - num_frames)
+    return np.arange(front, front + num_frames, dtype=np.int64)
+
+
+def _mode_keyframes(total_frames: int, num_frames: int, fps: int, *args) -> np.ndarray:
+    """The ``keyframes`` mode for frame extraction
+
+    The indices are with respect to the key frames of the video, since all
+    the other frames are skipped by the decoder in this mode.
+
+    """
+    return _mode_auto(total_frames, num_frames, fps)
+
+
+def _mode_scene(
+    total_frames: int, num_frames: int, fps: int, scores: np.ndarray
+) -> np.ndarray:
+    """The ``scene`` mode for frame extraction
+
+    Unlike the other modes, it takes the scene change score of every frame
+    (computed by FFmpeg) instead of a seed. The frames with the highest
+    scores are selected, the first frame being the start of a scene.
+
+    If there are more frames with the lowest selected score than needed
+    (for example, the frames of a static video, whose scores are all 0),
+    the frames are picked at equal intervals among them, instead of the
+    first ones.
+
+    """
+    scores = np.array(scores, dtype=np.float64)
+    scores[0] = np.inf
+    threshold = np.sort(scores)[::-1][num_frames - 1]
+    selected = np.flatnonzero(scores > threshold)
+    tied = np.flatnonzero(scores == threshold)
+    # The middle of each of the equal intervals of the tied frames
+    remaining = num_frames - len(selected)
+    picked = ((np.arange(remaining) + 0.5) * len(tied) / remaining).astype(np.int64)
+    return np.sort(np.concatenate([selected, tied[picked]])).astype(np.int64)
+
+
+def _batch_auto(
+    total_frames: np.ndarray, num_frames: int, fps: np.ndarray, *args
+) -> np.ndarray:
+    """The batched ``auto`` mode for frame extraction"""
+    # Same as `np.linspace(0, total_frames, num_frames, endpoint=False)`
+    step = total_frames / num_frames
+    return (np.arange(num_frames) * step[:, np.newaxis]).astype(np.int64)
+
+
+def _batch_random(
+    total_frames: np.ndarray, num_frames: int, fps: np.ndarray, seeds: np.ndarray
+) -> np.ndarray:
+    """The batched ``random`` mode for frame extraction
+
+    The frames are sampled (without repetition) with Floyd's algorithm,
+    for all the videos at once. Each video has its own stream of random
+    numbers, which only depends on its seed.
+
+    """
+    seeds = _splitmix64(seeds.astype(np.uint64))
+    counters = _splitmix64(np.arange(num_frames, dtype=np.uint64))
+    indices = np.empty((num_frames, len(total_frames)), dtype=np.int64)
+    for idx in range(num_frames):
+        # The next random number in the stream of each video
+        high = total_frames - (num_frames - idx - 1)
+        choice = _splitmix64(seeds ^ counters[idx]) % high.astype(np.uint64)
+        choice = choice.astype(np.int64)
+        repeated = np.zeros(len(total_frames), dtype=bool)
+        for previous in indices[:idx]:
+            repeated |= previous == choice
+        indices[idx] = np.where(repeated, high - 1, choice)
+    indices = indices.T
+    return np.sort(indices, axis=1)
+
+
+def _batch_first(
+    total_frames: np.ndarray, num_frames: int, fps: np.ndarray, *args
+) -> np.ndarray:
+    """The batched ``first`` mode for frame extraction"""
+    indices = np.arange(num_frames, dtype=np.int64)
+    return np.repeat(indices[np.newaxis], len(total_frames), axis=0)
+
+
+def _batch_last(
+    total_frames: np.ndarray, num_frames: int, fps: np.ndarray, *args
+) -> np.ndarray:
+    """The batched ``last`` mode for frame extraction"""
+    front = total_frames - num_frames
+    return front[:, np.newaxis] + np.arange(num_frames, dtype=np.int64)
+
+
+def _batch_middle(
+    total_frames: np.ndarray, num_frames: int, fps: np.ndarray, *args
+) -> np.ndarray:
+    """The batched ``middle`` mode for frame extraction"""
+    front = np.minimum(
+        ((total_frames - num_frames) // 2) + 1, total_frames - num_frames
+    )
+    return front[:, np.newaxis] + np.arange(num_frames, dtype=np.int64)
+
+
+# The batched version of each of the built-in modes
+_BATCHED_MODES = {
+    _mode_auto: _batch_auto,
+    _mode_random: _batch_random,
+    _mode_first: _batch_first,
+    _mode_last: _batch_last,
+    _mode_middle: _batch_middle,
+    _mode_keyframes: _batch_auto,
+}
+# The modes that use the seed of the video
+_SEEDED_MODES = {_mode_random}
+# The modes that depend on the content of the video, and therefore cannot
+# be computed from its meta-data alone
+_CONTENT_MODES = {_mode_scene}
+
+
+def _video_seeds(random_state: int, keys: list) -> np.ndarray:
+    """Derives the seed of each video from ``random_state`` and the key of
+    the video (its path, or its position if it has no path).
+
+    The seed of a video therefore does not depend on the other videos, or
+    on the order in which the videos are read.
+
+    """
+    if random_state is None:
+        random_state = np.random.SeedSequence().generate_state(1)[0]
+    keys = np.array(
+        [
+            zlib.crc32(key.encode("utf-8")) if isinstance(key, str) else key
+            for key in keys
+        ],
+        dtype=np.int64,
+    )
+    state = _splitmix64(np.array([random_state], dtype=np.int64).astype(np.uint64))
+    seeds = _splitmix64(state ^ _splitmix64(keys.astype(np.uint64)))
+    # Non-negative, so that they can be passed on as `int` seeds
+    return (seeds >> np.uint64(1)).astype(np.int64)
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    """The SplitMix64 hash of an array of ``uint64``, used as a counter-based
+    random number generator."""
+    with np.errstate(over="ignore"):
+        z = x + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
@@ -14,6 +14,7 @@ EMAIL = "mrinaljain007@gmail.com"
 VERSION = __version__
 
 REQUIRED = ["numpy>=1.14.5", "ffmpeg-python>=0.1.16", "tqdm>=4.25.0"]
+EXTRAS = {"pyav": ["av>=10.0.0"]}
 
 here = os.path.abspath(os.path.dirname(__file__))
 
@@ -33,6 +34,7 @@ setup(
     author_email=EMAIL,
     license="MIT",
     install_requires=REQUIRED,
+    extras_require=EXTRAS,
     setup_requires=["pytest-runner"],
     tests_require=["pytest", "numpy"],
     classifiers=[
@@ -0,0 +1,17 @@
+import subprocess
+import sys
+
+# The dependencies that should only be imported when they are needed
+LAZY_MODULES = ["ffmpeg", "tqdm", "multiprocessing"]
+
+
+def test_lazy_imports():
+    code = (
+        "import sys, mydia, mydia.store; "
+        f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], stdout=subprocess.PIPE, check=True
+    ).stdout
+
+    assert out.decode().strip() == ""
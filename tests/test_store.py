@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+from mydia import Videos
+from mydia.backends import FFmpegBackend
+from mydia.store import StoreReader, StoreWriter, export
+
+
+def make_videos(num_videos, seed=0):
+    r = np.random.RandomState(seed)
+    return [
+        r.randint(0, 255, size=(r.randint(1, 5), 6, 8, 3), dtype=np.uint8)
+        for _ in range(num_videos)
+    ]
+
+
+def test_store(tmp_path):
+    videos = make_videos(10)
+    with StoreWriter(str(tmp_path), shard_size=1000, name="a") as writer:
+        for idx, video in enumerate(videos):
+            writer.add(video, key=f"video-{idx}")
+    store = StoreReader(str(tmp_path))
+
+    assert len(store) == len(videos)
+    assert len({entry["shard"] for entry in store.entries}) > 1
+    assert store.keys == [f"video-{idx}" for idx in range(10)]
+    for idx in np.random.permutation(len(videos)):
+        assert isinstance(store[idx].base, np.memmap)
+        assert np.array_equal(store[idx], videos[idx])
+
+
+def test_store_append(tmp_path):
+    videos = make_videos(6)
+    # Two writers in parallel, and one of them appending later on
+    writer_a = StoreWriter(str(tmp_path), name="a")
+    writer_b = StoreWriter(str(tmp_path), name="b")
+    writer_a.add(videos[0])
+    writer_b.add(videos[3])
+    writer_a.add(videos[1])
+    writer_b.add(videos[4].astype("float") / 255)
+    writer_b.close()
+    writer_a.close()
+    with StoreWriter(str(tmp_path), name="a") as writer:
+        writer.add(videos[2])
+    store = StoreReader(str(tmp_path))
+
+    assert len(store) == 5
+    for idx in range(3):
+        assert np.array_equal(store[idx], videos[idx])
+    assert np.array_equal(store[3], videos[3])
+    assert store[4].dtype == np.float64
+    assert np.allclose(store[4], videos[4] / 255)
+
+
+def test_store_order(tmp_path):
+    videos = make_videos(5)
+    # Written in the order they were read, not in the order of their paths
+    order = [3, 0, 4, 1, 2]
+    with StoreWriter(str(tmp_path), shard_size=1000, name="a") as writer:
+        for idx in order:
+            writer.add(videos[idx], key=f"video-{idx}", index=idx)
+    store = StoreReader(str(tmp_path))
+
+    assert store.keys == [f"video-{idx}" for idx in range(5)]
+    for idx, video in enumerate(videos):
+        assert np.array_equal(store[idx], video)
+
+
+def test_export(tmp_path):
+    path = "./docs/examples/sample_video/bigbuckbunny.mp4"
+    reader = Videos(target_size=(64, 48), num_frames=6)
+    expected = reader.read([path, path], verbose=0)
+    export(reader, [path, path], str(tmp_path), name="export", verbose=0)
+    store = StoreReader(str(tmp_path))
+
+    assert np.array_equal(np.stack(list(store)), expected)
+    assert store.keys == [path, path]
+    assert store.infos[0]["total_frames"] == 132
+    assert store.settings["export"]["num_frames"] == 6
+    assert store.settings["export"]["mode"] == "auto"
+
+
+def test_export_resume(tmp_path):
+    class CrashingBackend(FFmpegBackend):
+        """Fails after decoding ``limit`` videos."""
+
+        def __init__(self, limit=None):
+            self.limit = limit
+            self.decoded = []
+
+        def decode(self, spec, task):
+            if len(self.decoded) == self.limit:
+                raise RuntimeError("Crashed")
+            self.decoded.append(task.key)
+            return super().decode(spec, task)
+
+    path = "./docs/examples/sample_video/bigbuckbunny.mp4"
+    with open(path, "rb") as f:
+        paths = [path, f.read(), path, path]
+    reader = Videos(target_size=(64, 48), num_frames=4, mode="random")
+    expected = reader.read(paths, verbose=0)
+
+    # Each video is in a shard of its own
+    backend = CrashingBackend(limit=3)
+    crashing = Videos(
+        target_size=(64, 48), num_frames=4, mode="random", backend=backend
+    )
+    with pytest.raises(RuntimeError):
+        export(crashing, paths, str(tmp_path), shard_size=1, name="job", verbose=0)
+    assert len(StoreReader(str(tmp_path))) == 3
+
+    backend = CrashingBackend()
+    resumed = Videos(target_size=(64, 48), num_frames=4, mode="random", backend=backend)
+    export(resumed, paths, str(tmp_path), name="job", verbose=0, resume=True)
+    store = StoreReader(str(tmp_path))
+
+    assert backend.decoded == [path]
+    assert [entry["index"] for entry in store.entries] == [0, 1, 2, 3]
+    assert np.array_equal(np.stack(list(store)), expected)
+
+    with pytest.raises(ValueError):
+        export(reader, paths[::-1], str(tmp_path), name="job", verbose=0, resume=True)
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from mydia import MODES, VideoInfo, plan_indices, shard_indices
+
+
+@pytest.mark.parametrize("mode", ["auto", "random", "first", "last", "middle"])
+def test_plan_indices(mode):
+    total_frames = np.array([36, 132, 500, 37, 1000])
+    keys = [f"video_{idx}.mp4" for idx in range(len(total_frames))]
+    indices = plan_indices(total_frames, 36, mode=mode, keys=keys)
+
+    assert indices.shape == (5, 36)
+    assert np.all(indices >= 0) and np.all(indices < total_frames[:, np.newaxis])
+    assert np.all(np.diff(indices, axis=1) > 0)
+
+    # Same as calling the mode for each video
+    seeds = plan_indices(
+        total_frames, 36, mode=lambda *args: [args[-1]] * 36, keys=keys
+    )
+    for idx, total in enumerate(total_frames):
+        expected = MODES[mode](int(total), 36, 25, int(seeds[idx, 0]))
+        assert np.array_equal(indices[idx], expected)
+
+
+def test_plan_indices_reproducibility():
+    total_frames = np.array([100, 200, 300, 400])
+    keys = ["a.mp4", "b.mp4", "c.mp4", "d.mp4"]
+    indices = plan_indices(total_frames, 8, mode="random", keys=keys)
+    shuffled = plan_indices(total_frames[::-1], 8, mode="random", keys=keys[::-1])
+
+    # The frames of a video do not depend on the order of the videos
+    assert np.array_equal(indices, shuffled[::-1])
+    assert not np.array_equal(
+        indices, plan_indices(total_frames, 8, mode="random", keys=keys, random_state=1)
+    )
+
+    with pytest.raises(IndexError):
+        plan_indices(total_frames, 101)
+
+
+def test_scene_mode():
+    scores = [0.0, 0.01, 0.9, 0.02, 0.02, 0.5, 0.0]
+    indices = MODES["scene"](len(scores), 4, 25, scores)
+
+    # The first frame, the two cuts, and one of the tied frames
+    assert np.array_equal(indices, [0, 2, 4, 5])
+
+    # A static video: the frames are picked at equal intervals
+    indices = MODES["scene"](100, 4, 25, np.zeros(100))
+    assert np.array_equal(indices, [0, 17, 50, 83])
+
+    with pytest.raises(ValueError):
+        plan_indices([100, 200], 8, mode="scene")
+
+
+def test_shard_indices():
+    frames = [1000, 10, 10, 10, 10, 500, 500, 20, 30, 5]
+    infos = [VideoInfo(25, num, None, 64, 48, None) for num in frames] + [None]
+    shards = [shard_indices(infos, rank, 3) for rank in range(3)]
+
+    # Every video is in exactly one shard
+    assert np.array_equal(np.sort(np.concatenate(shards)), np.arange(len(infos)))
+    # The most costly video is alone in its shard
+    assert np.array_equal(shards[0], [0])
+    loads = [sum(frames[idx] for idx in shard if idx < len(frames)) for shard in shards]
+    assert max(loads) == 1000 and min(loads) >= 500
+    assert np.array_equal(shard_indices(infos, 1, 3), shards[1])
+
+    with pytest.raises(ValueError):
+        shard_indices(infos, 3, 3)
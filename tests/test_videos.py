@@ -1,8 +1,40 @@
+import io
+import json
+import multiprocessing
+import os
+import subprocess
+import tarfile
+import tempfile
+import zipfile
+from functools import partial
 from multiprocessing import cpu_count
 
 import numpy as np
 import pytest
-from mydia import Videos, make_grid
+from mydia import (
+    CompressedVideos,
+    FFmpegError,
+    RaggedVideos,
+    Videos,
+    archive_members,
+    contact_sheet,
+    make_grid,
+    read_multi,
+    set_progress_bar,
+    sources,
+    yuv420_to_rgb,
+)
+from mydia.backends import FFmpegBackend
+from mydia.mydia import (
+    MAX_OUTPUT,
+    _decode_task,
+    _decode_video,
+    _estimate_nbytes,
+    _max_output,
+    _Task,
+    _tuning_key,
+)
+from mydia.sources import _open_source
 
 path = "./docs/examples/sample_video/bigbuckbunny.mp4"
 settings = [
@@ -23,7 +55,7 @@ def test_reader(target_size, to_gray, num_frames, normalize, expected_shape):
         normalize=normalize,
     )
     video = reader.read(path, verbose=0)
-    
+
     assert video.shape == expected_shape
     if normalize:
         assert (np.min(video) >= 0) and (np.max(video) <= 1)
@@ -81,3 +113,536 @@ def test_make_grid():
     grid_height = (target_height * num_row) + (padding * (num_row + 1))
 
     assert grid.shape == (grid_height, grid_width, 3)
+
+
+def test_decoder_shortcuts():
+    reader = Videos(lowres=1)
+    video = reader.read(path, verbose=0)
+    assert video.shape == (1, 132, 360, 640, 3)
+
+    reader = Videos(target_size=(360, 240), mode="keyframes")
+    video = reader.read(path, verbose=0)
+    assert reader.skip_frame == "nokey"
+    assert (video.shape[1] >= 1) and (video.shape[1] < 132)
+    assert video.shape[2:] == (240, 360, 3)
+
+    # The key frames mode does not silently override another 'skip_frame'
+    assert Videos(mode="keyframes", skip_frame="nokey").skip_frame == "nokey"
+    with pytest.raises(ValueError):
+        Videos(mode="keyframes", skip_frame="bidir")
+
+
+def test_make_grid_layout():
+    padding = 2
+    video = np.arange(7 * 4 * 6 * 3, dtype=np.uint8).reshape(7, 4, 6, 3)
+    grid = make_grid(video, num_col=3, padding=padding)
+
+    assert grid.shape == (3 * 4 + 4 * padding, 3 * 6 + 4 * padding, 3)
+    for idx in range(7):
+        row, col = divmod(idx, 3)
+        top, left = padding + row * (4 + padding), padding + col * (6 + padding)
+        assert np.array_equal(grid[top : top + 4, left : left + 6], video[idx])
+    # The cells without a frame are left empty
+    assert not grid[-(4 + padding) :, -(2 * 6 + 2 * padding) :].any()
+
+    # A `channels_first` view, a batch of videos and a preallocated output
+    channels_first = np.transpose(video, axes=(3, 0, 1, 2))
+    assert np.array_equal(make_grid(channels_first, num_col=3, padding=padding), grid)
+    batch = make_grid(np.stack([video, video[::-1]]), num_col=3, padding=padding)
+    assert batch.shape == (2,) + grid.shape
+    assert np.array_equal(batch[0], grid)
+    out = np.empty_like(grid)
+    assert make_grid(video, num_col=3, padding=padding, out=out) is out
+    assert np.array_equal(out, grid)
+    out = np.empty_like(grid[..., 0])
+    assert make_grid(video[..., :1], num_col=3, padding=padding, out=out) is out
+    assert np.array_equal(out, grid[..., 0])
+
+
+@pytest.mark.parametrize("to_gray", [False, True])
+def test_contact_sheet(to_gray):
+    reader = Videos(target_size=(96, 54), to_gray=to_gray, num_frames=7)
+    grid = make_grid(reader.read(path, verbose=0)[0], num_col=3, padding=5)
+    grids = contact_sheet(
+        [path, path],
+        num_frames=7,
+        num_col=3,
+        padding=5,
+        target_size=(96, 54),
+        to_gray=to_gray,
+        verbose=0,
+    )
+
+    assert grids.shape == (2,) + grid.shape
+    assert np.array_equal(grids[0], grid)
+
+
+@pytest.mark.parametrize("start_method", ["fork", "spawn"])
+def test_parallel_spec(start_method):
+    if start_method not in multiprocessing.get_all_start_methods():
+        pytest.skip(f"The start method '{start_method}' is not available")
+
+    # A lambda cannot be pickled, but is inherited by the forked workers
+    # whatever the start method set by the user
+    reader = Videos(
+        num_frames=4, mode=lambda total_frames, num_frames, *args: [0, 2, 4, 6]
+    )
+    previous = multiprocessing.get_start_method(allow_none=True)
+    multiprocessing.set_start_method(start_method, force=True)
+    try:
+        video = reader.read([path, path], verbose=0, workers=1)
+    finally:
+        multiprocessing.set_start_method(previous, force=True)
+
+    assert video.shape == (2, 4, 720, 1280, 3)
+    # Reading does not alter the configuration of the reader
+    assert reader.target_size is None
+    assert reader.spec.target_size is None
+
+
+def test_ragged_videos():
+    videos = [
+        np.random.randint(0, 255, size=shape, dtype=np.uint8)
+        for shape in [(4, 6, 8, 3), (2, 10, 4, 3), (5, 6, 8, 3)]
+    ]
+    ragged = RaggedVideos.from_videos(videos)
+
+    assert len(ragged) == 3
+    assert ragged.data.ndim == 1
+    assert ragged.data.size == sum(video.size for video in videos)
+    for video, expected in zip(ragged, videos):
+        assert np.shares_memory(video, ragged.data)
+        assert np.array_equal(video, expected)
+
+    ragged.data_format = "channels_first"
+    assert np.array_equal(ragged[-1], np.transpose(videos[-1], axes=(3, 0, 1, 2)))
+
+
+@pytest.mark.parametrize("variable_size", ["ragged", "pad"])
+def test_variable_size(tmp_path, variable_size):
+    # Two clips of different resolutions and lengths
+    clips = []
+    for width, height, frames in [(96, 64, 12), (64, 48, 20)]:
+        clip = str(tmp_path / f"clip_{width}x{height}.avi")
+        subprocess.run(
+            ["ffmpeg", "-loglevel", "error", "-i", path, "-vf"]
+            + [f"scale={width}:{height}", "-frames:v", str(frames)]
+            + ["-c:v", "mpeg4", "-q:v", "2", clip],
+            check=True,
+        )
+        clips.append(clip)
+    expected = [Videos().read(clip, verbose=0)[0] for clip in clips]
+    assert [video.shape for video in expected] == [(12, 64, 96, 3), (20, 48, 64, 3)]
+
+    reader = Videos(variable_size=variable_size)
+    output = reader.read(clips, verbose=0)
+
+    if variable_size == "ragged":
+        assert isinstance(output, RaggedVideos)
+        assert [video.shape for video in output] == [(12, 64, 96, 3), (20, 48, 64, 3)]
+        for video, clip in zip(output, expected):
+            assert np.array_equal(video, clip)
+    else:
+        videos, mask = output
+        assert videos.shape == (2, 20, 64, 96, 3)
+        assert mask.shape == (2, 20, 64, 96)
+        for idx, clip in enumerate(expected):
+            frames, height, width, _ = clip.shape
+            assert np.array_equal(videos[idx, :frames, :height, :width], clip)
+            assert mask[idx, :frames, :height, :width].all()
+            # The padding is masked out, and filled with zeros
+            assert mask[idx].sum() == frames * height * width
+            assert not videos[idx][~mask[idx]].any()
+
+
+def test_memory_budget(tmp_path, monkeypatch):
+    reader = Videos(target_size=(64, 48), num_frames=10)
+    expected = reader.read([path, path], verbose=0)
+
+    spill_path = str(tmp_path / "videos.npy")
+    video = reader.read([path, path], verbose=0, max_memory=1024, spill_path=spill_path)
+    assert isinstance(video, np.memmap)
+    assert np.array_equal(video, expected)
+    assert np.array_equal(np.load(spill_path), expected)
+
+    # The temporary file is removed, but the tensor can still be used
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path / "temp"))
+    os.makedirs(tempfile.tempdir)
+    video = reader.read([path, path], verbose=0, max_memory=1024)
+    assert isinstance(video, np.memmap)
+    assert os.listdir(tempfile.tempdir) == []
+    assert np.array_equal(video, expected)
+
+    reader = Videos(target_size=(64, 48), num_frames=10, variable_size="ragged")
+    with pytest.raises(MemoryError, match="max_memory="):
+        reader.read([path, path], verbose=0, max_memory=1024)
+
+    # Only the frames that are decoded are counted
+    for backend in ["ffmpeg", "pyav"]:
+        reader = Videos(target_size=(64, 48), mode="keyframes", backend=backend)
+        video = reader.read(path, verbose=0)
+        info = reader.spec.backend.probe(reader.spec, path)
+        assert _estimate_nbytes(reader.spec, [info]) == video.nbytes
+
+    for data_format in ["channels_last", "channels_first"]:
+        with pytest.raises(ValueError, match="'paths'"):
+            Videos(data_format=data_format).read([], verbose=0)
+
+
+def test_iter_read():
+    reader = Videos(target_size=(64, 48), num_frames=10)
+    expected = reader.read([path] * 3, verbose=0)
+    batches = list(reader.iter_read([path] * 3, batch_size=2, verbose=0))
+
+    assert [batch.shape[0] for batch in batches] == [2, 1]
+    assert np.array_equal(np.concatenate(batches), expected)
+
+
+def test_in_memory_sources(tmp_path):
+
+    reader = Videos(target_size=(64, 48), num_frames=6)
+    expected = reader.read(path, verbose=0)
+    with open(path, "rb") as f:
+        data = f.read()
+
+    tar_path = str(tmp_path / "videos.tar")
+    with tarfile.open(tar_path, "w") as archive:
+        archive.add(path, arcname="a.mp4")
+        archive.add(path, arcname="b.txt")
+    zip_path = str(tmp_path / "videos.zip")
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.write(path, arcname="c.mp4")
+
+    members = archive_members(tar_path) + archive_members(zip_path)
+    assert [member.name for member in members] == ["a.mp4", "c.mp4"]
+
+    sources = [data, io.BytesIO(data)] + members
+    videos = reader.read(sources, verbose=0)
+    for video in videos:
+        assert np.array_equal(video, expected[0])
+
+
+def test_compressed_archive(tmp_path, monkeypatch):
+
+    reader = Videos(target_size=(64, 48), num_frames=6)
+    expected = reader.read(path, verbose=0)
+
+    tar_path = str(tmp_path / "videos.tar.gz")
+    with tarfile.open(tar_path, "w:gz") as archive:
+        for name in ["a.mp4", "b.mp4", "c.mp4"]:
+            archive.add(path, arcname=name)
+    members = archive_members(tar_path)
+    assert all(member.offset is None for member in members)
+
+    # The archive is decompressed once, and each video loaded once (not
+    # once to probe it and once more to decode it)
+    opened, loaded = [], []
+    tar_open, load_source = tarfile.open, sources._load_source
+    monkeypatch.setattr(
+        tarfile,
+        "open",
+        lambda *args, **kwargs: opened.append(args) or tar_open(*args, **kwargs),
+    )
+    monkeypatch.setattr(
+        sources,
+        "_load_source",
+        lambda source: loaded.append(source) or load_source(source),
+    )
+    videos = reader.read(members, verbose=0)
+    assert len(opened) == 1
+    assert len(loaded) == len(members)
+    for video in videos:
+        assert np.array_equal(video, expected[0])
+
+
+@pytest.mark.parametrize("extension", ["mp4", "mkv"])
+def test_piped_sources(tmp_path, extension):
+
+    # Unlike the sample video, these can be read from a pipe: the MP4 file
+    # has its meta-data at the start ("faststart")
+    clip = str(tmp_path / f"clip.{extension}")
+    subprocess.run(
+        ["ffmpeg", "-loglevel", "error", "-i", path, "-vf", "scale=64:48"]
+        + ["-frames:v", "30", "-movflags", "+faststart", clip],
+        check=True,
+    )
+    with open(clip, "rb") as f:
+        data = f.read()
+    with _open_source(data) as opened:
+        assert opened.filename == "pipe:"
+
+    # All the frames are read, as MKV files do not record their number
+    reader = Videos()
+    expected = reader.read(clip, verbose=0)
+    assert expected.shape == (1, 30, 48, 64, 3)
+    videos = reader.read([data, io.BytesIO(data)], verbose=0)
+    for video in videos:
+        assert np.array_equal(video, expected[0])
+
+
+def test_read_multi():
+    readers = [
+        Videos(target_size=(64, 48), to_gray=True, num_frames=8),
+        Videos(target_size=(96, 54), num_frames=4, mode="random"),
+        Videos(num_frames=2, mode="last", data_format="channels_first"),
+    ]
+    videos = read_multi(readers, [path, path], verbose=0)
+
+    assert len(videos) == len(readers)
+    for reader, video in zip(readers, videos):
+        assert np.array_equal(video, reader.read([path, path], verbose=0))
+
+    with pytest.raises(ValueError):
+        read_multi([Videos(), Videos(lowres=1)], path, verbose=0)
+
+
+def test_progress_bar():
+    class ProgressBar(object):
+        def __init__(self, total, unit):
+            self.total, self.count = total, 0
+            bars.append(self)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            pass
+
+        def update(self):
+            self.count += 1
+
+    bars = []
+    reader = Videos(target_size=(64, 48), num_frames=2)
+    set_progress_bar(ProgressBar)
+    try:
+        reader.read([path, path], verbose=0)
+        assert bars == []
+        reader.read([path, path])
+    finally:
+        set_progress_bar(None)
+
+    assert [(bar.total, bar.count) for bar in bars] == [(2, 2)]
+
+
+@pytest.mark.parametrize(
+    ("target_size", "to_gray", "num_frames", "mode"),
+    [
+        (None, True, 6, "last"),
+        ((96, 54), False, 4, "random"),
+        ((96, 54), False, None, "auto"),
+    ],
+)
+def test_pyav_backend(target_size, to_gray, num_frames, mode):
+    pytest.importorskip("av")
+    settings = dict(
+        target_size=target_size, to_gray=to_gray, num_frames=num_frames, mode=mode
+    )
+    expected = Videos(**settings).read(path, verbose=0)
+    reader = Videos(backend="pyav", **settings)
+    video = reader.read(path, verbose=0)
+
+    assert video.shape == expected.shape
+    if target_size is None:
+        assert np.array_equal(video, expected)
+    else:
+        # The frames are converted and resized in a different order
+        assert np.abs(video.astype(int) - expected).max() <= 8
+
+    with open(path, "rb") as f:
+        data = f.read()
+    videos = reader.read([path, data], verbose=0, workers=2)
+    assert np.array_equal(videos[0], video[0])
+
+    with pytest.raises(ValueError):
+        Videos(backend="gstreamer")
+
+
+@pytest.mark.parametrize("backend", ["ffmpeg", "pyav"])
+def test_scene_mode(tmp_path, backend):
+    if backend == "pyav":
+        pytest.importorskip("av")
+
+    # Three scenes of 25 frames each, in red, blue and green
+    colors = ["red", "blue", "green"]
+    scenes = ";".join(
+        f"color=c={color}:s=64x48:r=25:d=1[s{idx}]" for idx, color in enumerate(colors)
+    )
+    cuts = str(tmp_path / "cuts.avi")
+    subprocess.run(
+        ["ffmpeg", "-loglevel", "panic", "-f", "lavfi", "-i"]
+        + [f"{scenes};[s0][s1][s2]concat=n=3[out0]", "-c:v", "mpeg4", cuts],
+        check=True,
+    )
+
+    reader = Videos(num_frames=3, mode="scene", backend=backend)
+    video = reader.read(cuts, verbose=0)
+
+    assert video.shape == (1, 3, 48, 64, 3)
+    # The first frame of each scene is selected
+    assert np.array_equal(np.argmax(video[0, :, 24, 32], axis=-1), [0, 2, 1])
+
+
+def test_probe():
+    reader = Videos(target_size=(64, 48), num_frames=8)
+    infos = reader.probe([path, path], verbose=0)
+
+    assert len(infos) == 2
+    assert (infos[0].total_frames, infos[0].width, infos[0].height) == (132, 1280, 720)
+    assert infos[0].target_size[:2] == (64, 48)
+
+
+def test_auto_workers(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    reader = Videos(target_size=(64, 48), num_frames=4)
+    expected = reader.read([path] * 5, verbose=0)
+
+    # The first read measures the tasks, and the second one uses the cache
+    for _ in range(2):
+        video = reader.read([path] * 5, verbose=0, workers="auto")
+        assert np.array_equal(video, expected)
+
+    with open(tmp_path / "mydia" / "autotune.json") as f:
+        (tuning,) = json.load(f).values()
+    assert tuning["_decode_task"]["task_time"] > 0
+    assert set(tuning) == {"_probe_task", "_decode_task"}
+
+
+def test_tuning_key():
+
+    def make_mode(offset):
+        # A new closure (at a new address) every time, as in every run
+        return lambda total_frames, num_frames, fps, seed: range(offset, num_frames)
+
+    def mode(total_frames, num_frames, fps, seed, offset):
+        return range(offset, num_frames)
+
+    for make in [make_mode, lambda offset: partial(mode, offset=offset)]:
+        keys = {
+            _tuning_key(Videos(num_frames=4, mode=make(0)).spec, [path])
+            for _ in range(2)
+        }
+        assert len(keys) == 1
+
+
+def test_timeout_retries():
+    class FlakyBackend(FFmpegBackend):
+        """Times out on every other attempt to read a video."""
+
+        def __init__(self):
+            self.attempts = []
+
+        def decode(self, spec, task):
+            self.attempts.append(task.key)
+            if len(self.attempts) % 2 == 1:
+                raise TimeoutError("Timed out")
+            return super().decode(spec, task)
+
+    reader = Videos(target_size=(64, 48), num_frames=4)
+    expected = reader.read([path, path], verbose=0)
+
+    backend = FlakyBackend()
+    reader = Videos(target_size=(64, 48), num_frames=4, backend=backend, retries=1)
+    assert np.array_equal(reader.read([path, path], verbose=0), expected)
+    assert len(backend.attempts) == 4
+
+    reader = Videos(target_size=(64, 48), num_frames=4, backend=FlakyBackend())
+    with pytest.raises(TimeoutError):
+        reader.read(path, verbose=0)
+
+    reader = Videos(target_size=(64, 48), num_frames=4, timeout=1e-3)
+    with pytest.raises(TimeoutError):
+        reader.read(path, verbose=0)
+
+    # Videos that FFmpeg fails to read are not retried
+    class FailingBackend(FFmpegBackend):
+        attempts = 0
+
+        def decode(self, spec, task):
+            FailingBackend.attempts += 1
+            return super().decode(spec, task)
+
+    info = Videos(target_size=(64, 48), num_frames=4).probe(path, verbose=0)[0]
+    reader = Videos(
+        target_size=(64, 48), num_frames=4, backend=FailingBackend(), retries=2
+    )
+    task = _Task(b"not a video" * 100, info)
+    with pytest.raises(FFmpegError):
+        _decode_task(reader.spec, task)
+    assert FailingBackend.attempts == 1
+
+
+@pytest.mark.parametrize("backend", ["ffmpeg", "pyav"])
+def test_yuv420p(backend):
+    reader = Videos(target_size=(64, 48), num_frames=4, backend=backend)
+    expected = reader.read(path, verbose=0)
+    reader = Videos(
+        target_size=(64, 48), num_frames=4, pix_fmt="yuv420p", backend=backend
+    )
+    video = reader.read(path, verbose=0)
+
+    assert video.shape == (1, 4, 72, 64, 1)
+    rgb = yuv420_to_rgb(video)
+    assert rgb.shape == expected.shape
+    assert np.mean(np.abs(rgb.astype(int) - expected)) < 4
+
+    with pytest.raises(ValueError):
+        Videos(target_size=(63, 48), pix_fmt="yuv420p")
+    with pytest.raises(ValueError):
+        Videos(to_gray=True, pix_fmt="yuv420p")
+
+
+def test_compressed_videos():
+    # Consecutive frames, which differ little from each other
+    reader = Videos(target_size=(64, 48), num_frames=8, mode="first")
+    video = reader.read([path, path], verbose=0)
+    compressed = CompressedVideos.from_videos(video)
+
+    assert len(compressed) == 2
+    assert compressed.nbytes < video.nbytes / 2
+    assert np.array_equal(compressed.decompress(), video)
+
+    reader = Videos(target_size=(64, 48), num_frames=8, normalize=True, dtype="float32")
+    video = reader.read(path, verbose=0)
+    assert video.dtype == np.float32
+    assert np.array_equal(CompressedVideos.from_videos(video)[0], video[0])
+
+
+def test_subprocess_limits():
+    reader = Videos(target_size=(64, 48))
+    info = reader.probe(path, verbose=0)[0]
+
+    # The meta-data understates the number of frames
+    task = _Task(path, info._replace(total_frames=5))
+    with pytest.raises(MemoryError):
+        _decode_video(reader.spec, task)
+    # Without the number of frames (as for most MKV and WebM files), the
+    # limit is derived from the duration
+    task = _Task(path, info._replace(total_frames=None, duration=0.2))
+    with pytest.raises(MemoryError):
+        _decode_video(reader.spec, task)
+    unknown = info._replace(total_frames=None, duration=None)
+    assert _max_output(reader.spec, unknown) == MAX_OUTPUT
+
+    task = _Task(b"not a video" * 100, info)
+    with pytest.raises(FFmpegError) as error:
+        _decode_video(reader.spec, task)
+    assert error.value.returncode != 0
+    assert b"Invalid data" in error.value.stderr
+
+
+@pytest.mark.parametrize("backend", ["ffmpeg", "pyav"])
+def test_corrupt_video(tmp_path, backend):
+    # A truncated video, without its meta-data
+    with open(path, "rb") as f:
+        data = f.read(20000)
+    corrupt = str(tmp_path / "corrupt.mp4")
+    with open(corrupt, "wb") as f:
+        f.write(data)
+
+    reader = Videos(target_size=(64, 48), num_frames=4, backend=backend)
+    with pytest.raises(FFmpegError) as error:
+        reader.read([path, corrupt], verbose=0)
+    assert error.value.filename == corrupt
+    assert error.value.stderr
+    with pytest.raises(FFmpegError):
+        reader.probe(corrupt, verbose=0)